@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Handler benchmark suite
+Synthetic Update/CallbackQuery objects RenderInternetBot ke handlers se guzarte hain, ek fake
+Bot API ke against jo network ki jagah calls record karta hai. Har scenario ka throughput
+aur p50/p95/p99 latency report hota hai.
+
+Usage:
+    python bench.py --users 10000 --iterations 2000
+    python bench.py --users 1000000 --iterations 5000 --concurrency 32 --json bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import CallbackContext
+from telegram.request import BaseRequest
+
+from fake_bot_api import api_result
+from traces import callback_update, command_update
+
+REFERRER_POOL = 1000
+
+
+class FakeBotRequest(BaseRequest):
+    """Bot API stand-in: answers every method locally and counts the calls"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        name = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if name in ('sendMessage', 'editMessageText', 'sendDocument'):
+            self._message_id += 1
+        result = api_result(name, params, self._message_id)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def populate(conn, users: int, seed: int = 7):
+    """Bulk-insert synthetic users (ids 1..users) and referral edges"""
+    rng = random.Random(seed)
+    conn.execute("BEGIN")
+    batch = []
+    for user_id in range(1, users + 1):
+        referral_count = rng.choice((0, 0, 1, 2, 3, 5, 8, 10, 12, 20))
+        batch.append((
+            user_id, f"user{user_id}", f"U{user_id}", 1,
+            f"B{user_id:09d}",  # 10 chars - bot ke codes se kabhi nahi takrata
+            referral_count, referral_count * 15, int(referral_count >= 10), int(referral_count >= 10),
+        ))
+        if len(batch) >= 50000:
+            conn.executemany(
+                "INSERT INTO users (user_id, username, first_name, joined_channel, referral_code, "
+                "referral_count, balance, app_access, withdrawal_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, first_name, joined_channel, referral_code, "
+            "referral_count, balance, app_access, withdrawal_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+    conn.executemany(
+        "INSERT INTO referrals (referrer_id, referred_id) VALUES (?, ?)",
+        ((rng.randint(1, min(users, REFERRER_POOL)), referred) for referred in range(REFERRER_POOL + 1, users + 1, 2)),
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Bench:
+    def __init__(self, bot, request: FakeBotRequest, users: int, iterations: int, concurrency: int, seed: int):
+        self.bot = bot
+        self.app = bot.application
+        self.request = request
+        self.users = users
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        self.next_update_id = 1
+        self.next_new_user = users + 1_000_000
+
+    def update(self, data: dict) -> Update:
+        return Update.de_json(data, self.app.bot)
+
+    def context(self, update: Update, args=None):
+        context = CallbackContext.from_update(update, self.app)
+        context.args = args or []
+        return context
+
+    def _update_id(self) -> int:
+        self.next_update_id += 1
+        return self.next_update_id
+
+    def _new_user(self) -> int:
+        self.next_new_user += 1
+        return self.next_new_user
+
+    def _existing_user(self) -> int:
+        return self.rng.randint(1, self.users)
+
+    def scenarios(self):
+        """name -> factory returning (handler coroutine function, update, context)"""
+        bot = self.bot
+
+        def start_new():
+            update = self.update(command_update(self._update_id(), self._new_user(), "/start"))
+            return bot.start_command, update, self.context(update)
+
+        def start_referral():
+            code = f"B{self.rng.randint(1, min(self.users, REFERRER_POOL)):09d}"
+            update = self.update(command_update(self._update_id(), self._new_user(), f"/start {code}"))
+            return bot.start_command, update, self.context(update, [code])
+
+        def start_existing():
+            update = self.update(command_update(self._update_id(), self._existing_user(), "/start"))
+            return bot.start_command, update, self.context(update)
+
+        def button(data):
+            def make():
+                update = self.update(callback_update(self._update_id(), self._existing_user(), data))
+                return bot.button_handler, update, self.context(update)
+            return make
+
+        def process_withdrawal():
+            # Har iteration naya user jiske paas access aur balance hai
+            user_id = self._new_user()
+            bot.db.run_sync(lambda conn: conn.execute(
+                "INSERT INTO users (user_id, referral_code, joined_channel, referral_count, balance, "
+                "withdrawal_access) VALUES (?, ?, 1, 10, 150, 1)", (user_id, f"W{user_id:09d}")
+            ))
+            update = self.update(command_update(self._update_id(), user_id, "/withdraw bench@upi"))
+
+            async def handler(update, context):
+                await bot.process_withdrawal(update, context, user_id, "bench@upi")
+            return handler, update, self.context(update, ["bench@upi"])
+
+        return {
+            "start_new": start_new,
+            "start_referral": start_referral,
+            "start_existing": start_existing,
+            "button_main_menu": button("main_menu"),
+            "button_check_balance": button("check_balance"),
+            "button_get_referral": button("get_referral"),
+            "button_get_app_link": button("get_app_link"),
+            "button_withdraw_earnings": button("withdraw_earnings"),
+            "process_withdrawal": process_withdrawal,
+        }
+
+    async def run_scenario(self, make) -> dict:
+        prepared = [make() for _ in range(self.iterations)]
+        latencies = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(handler, update, context):
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(update, context)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*item) for item in prepared))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            "count": len(latencies),
+            "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        }
+
+
+def print_table(users: int, results: dict):
+    print(f"\n📊 Benchmark - {users:,} users")
+    print(f"{'scenario':<26}{'count':>8}{'ops/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['count']:>8}{r['throughput_per_s']:>11}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+
+
+async def run_size(users: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, "bench.db")
+    # Fake API par Telegram ki rate limits ka matlab nahi - notifier queue turant drain ho
+    os.environ.setdefault('NOTIFY_GLOBAL_RATE', '100000')
+    os.environ.setdefault('NOTIFY_PER_CHAT_RATE', '100000')
+    # Bot module config environment se import time par padhta hai
+    sys.modules.pop('internet_bot', None)
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        import internet_bot
+        request = FakeBotRequest(latency_ms=args.api_latency_ms)
+        bot = internet_bot.RenderInternetBot("123456:BENCHMARK", request=request)
+    bot.db.run_sync(lambda conn: populate(conn, users, args.seed), write=False)
+    # Bot ne khaali database se load kiya tha - warna start_existing naye user ka path naapta
+    bot.db.run_sync(bot.signups.load, write=False)
+    if isinstance(bot.user_cache, internet_bot.UserStore):
+        bot.db.run_sync(bot.user_cache.load, write=False)
+
+    app = bot.application
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    bench = Bench(bot, request, users, args.iterations, args.concurrency, args.seed)
+    selected = args.scenarios.split(',') if args.scenarios else None
+    results = {}
+    try:
+        for name, make in bench.scenarios().items():
+            if selected and name not in selected:
+                continue
+            with contextlib.redirect_stdout(quiet):
+                results[name] = await bench.run_scenario(make)
+    finally:
+        with contextlib.redirect_stdout(quiet):
+            if app.post_stop:
+                await app.post_stop(app)
+            await app.shutdown()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
+    print_table(users, results)
+    print(f"   Bot API calls: {dict(request.calls)}")
+    print(f"   User cache: {bot.user_cache.stats()}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RenderInternetBot handlers against a fake Bot API")
+    parser.add_argument("--users", default="10000", help="comma separated database sizes, e.g. 10000,1000000")
+    parser.add_argument("--iterations", type=int, default=1000, help="calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="handler calls in flight at once")
+    parser.add_argument("--scenarios", default="", help="comma separated subset of scenarios")
+    parser.add_argument("--api-latency-ms", type=float, default=0, help="simulated Bot API round trip")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default="", help="write results to this file")
+    args = parser.parse_args()
+
+    all_results = {}
+    for size in args.users.split(','):
+        users = int(size)
+        all_results[users] = asyncio.run(run_size(users, args))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+In-memory user state cache
+Menu/balance screens har tap par SQLite na padhein - state yahan se milti hai
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+
+# Hot per-user state jo screens ko chahiye
+USER_STATE_COLUMNS = "referral_code, joined_channel, referral_count, balance, app_access, withdrawal_access"
+UserState = namedtuple(
+    "UserState",
+    ["referral_code", "joined_channel", "referral_count", "balance", "app_access", "withdrawal_access"],
+)
+
+
+class UserStateCache:
+    """Bounded LRU cache with TTL, keyed by user_id
+
+    Every write path must call put() (write-through) or invalidate() for the user it
+    changed. Reads that miss go to the database and call fill() with the token taken by
+    snapshot() before the read; fill() drops the row if a write for that user happened in
+    between, so a slow read can never overwrite fresher state.
+    """
+
+    def __init__(self, max_size: int = 100000, ttl: float = 300):
+        self.max_size = max(max_size, 1)
+        self.ttl = ttl
+        # user_id -> [state or None (invalidated), expires_at, write stamp]
+        self._entries = OrderedDict()
+        self._clock = 0
+        self._evicted_stamp = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        """Return cached UserState or None"""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def snapshot(self) -> int:
+        """Token to pass to fill() - take it before starting the database read"""
+        return self._clock
+
+    def fill(self, user_id: int, state: UserState, token: int):
+        """Store a row read from the database unless a newer write already happened"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[2] > token:
+                return
+        elif self._evicted_stamp > token:
+            return
+        self._store(user_id, state, token)
+
+    def put(self, user_id: int, state: UserState):
+        """Write-through after a database write for this user"""
+        self._clock += 1
+        self._store(user_id, state, self._clock)
+
+    def invalidate(self, user_id: int):
+        """Forget cached state after a write whose result we don't have"""
+        self._clock += 1
+        self._store(user_id, None, self._clock)
+
+    def clear(self):
+        self._clock += 1
+        self._evicted_stamp = self._clock
+        self._entries.clear()
+
+    def _store(self, user_id: int, state, stamp: int):
+        self._entries[user_id] = [state, time.monotonic() + self.ttl, stamp]
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._evicted_stamp = max(self._evicted_stamp, evicted[2])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def load_user_state(conn, user_id: int):
+    """Read a user's state with the given connection (None if the user doesn't exist)"""
+    row = conn.execute(f"SELECT {USER_STATE_COLUMNS} FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    return UserState(*row) if row else None
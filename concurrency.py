@@ -0,0 +1,84 @@
+"""
+Concurrent update processing
+Alag users ke updates parallel chalte hain, ek hi user ke updates ek-ek karke
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, created on demand and dropped once nobody holds or waits on it"""
+
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, key):
+        """Hold the lock for key; key None means nothing to serialize on"""
+        if key is None:
+            yield
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+def update_key(update):
+    """Serialization key for an update - the user, else the chat, else None (no lock)"""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+# PTB ka apna semaphore (process_update mein, user lock se pehle) - itna bada ki kabhi na roke
+_UNBOUNDED = 2 ** 30
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to max_concurrent_updates updates at once, one at a time per user
+
+    A concurrency slot is taken only after the user's lock, so one user's queued burst
+    waits on its lock without holding slots other users need. (PTB's process_update
+    takes its own semaphore before do_process_update - that one is effectively unbounded,
+    so max_concurrent_updates reports it; the real limit is `limit`.)
+
+    The locks are shared with the bot, so code that touches another user's balance
+    (referral credit) can take that user's lock too.
+    """
+
+    def __init__(self, max_concurrent_updates: int, locks: KeyedLocks):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(_UNBOUNDED)
+        self.limit = max_concurrent_updates
+        self.locks = locks
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+
+    async def do_process_update(self, update, coroutine):
+        async with self.locks.hold(update_key(update)):
+            async with self._slots:
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
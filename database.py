@@ -0,0 +1,316 @@
+"""
+Async SQLite access layer for the bot
+Saare queries ek dedicated DB thread par chalte hain - handlers sirf await karte hain,
+isliye slow disk I/O event loop ko block nahi karta
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.request import pathname2url
+
+STORAGE_MODES = ('wal', 'legacy')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+# UPDATE/INSERT ... RETURNING SQLite 3.35 se hai - purane builds par alag SELECT karte hain
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class ObservedConnection(sqlite3.Connection):
+    """Connection that reports every statement to observer(sql, seconds, rows, failed)
+
+    rows is the cursor rowcount at execute() time (-1 for queries; RETURNING statements
+    count only rows stepped so far). Only used when Database gets an observer.
+    """
+
+    observer = None
+
+    def _observe(self, run, sql: str):
+        started = time.perf_counter()
+        try:
+            cursor = run()
+        except sqlite3.Error:
+            self.observer(sql, time.perf_counter() - started, 0, True)
+            raise
+        self.observer(sql, time.perf_counter() - started, cursor.rowcount, False)
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self._observe(lambda: sqlite3.Connection.execute(self, sql, parameters), sql)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._observe(lambda: sqlite3.Connection.executemany(self, sql, seq_of_parameters), sql)
+
+
+class Database:
+    """SQLite connection owned by a single background thread with a request queue
+
+    storage_mode 'wal' enables WAL journaling with tuned pragmas and serves reads from a
+    small pool of read-only connections, so readers don't wait behind the writer.
+    'legacy' keeps the old rollback-journal behaviour with everything on one connection.
+
+    Writes are group-committed: requests queued within commit_max_delay_ms (up to
+    commit_batch_size of them) share one transaction and one fsync, and each caller's
+    future resolves only after that COMMIT.
+
+    observer, if given, is called as observer(sql, seconds, rows, failed) for every
+    statement on every connection - from the DB threads, so it must be thread-safe.
+    """
+
+    def __init__(self, path: str, storage_mode: str = 'wal', read_pool_size: int = 4,
+                 synchronous: str = 'NORMAL', cache_size_kb: int = 16384,
+                 mmap_size: int = 64 * 1024 * 1024, commit_max_delay_ms: float = 2,
+                 commit_batch_size: int = 100, observer=None):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous}")
+        self.path = path
+        self.storage_mode = storage_mode
+        self.synchronous = synchronous.upper()
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        # Group commit - itne time tak / itne writes tak ek transaction mein jodte hain
+        self.commit_max_delay = max(commit_max_delay_ms, 0) / 1000
+        self.commit_batch_size = max(commit_batch_size, 1)
+        self.observer = observer
+        self.commits = 0
+        self.committed_requests = 0
+        # In-memory database ko doosra connection dekh hi nahi sakta - wahan pool nahi
+        self.read_pool_size = read_pool_size if storage_mode == 'wal' and path != ':memory:' else 0
+        self._requests = queue.Queue()
+        self._conn = None
+        self._thread = None
+        self._read_pool = None
+        self._read_local = threading.local()
+        self._read_conns = []
+        self._read_conns_lock = threading.Lock()
+
+    def start(self):
+        """Open the connection and start the DB thread"""
+        if self._thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory and self.path != ':memory:':
+            os.makedirs(directory, exist_ok=True)
+        # isolation_level=None - transactions hum khud BEGIN/COMMIT se manage karte hain
+        self._conn = self._connect(self.path)
+        self._configure_writer(self._conn)
+        self._thread = threading.Thread(target=self._worker, name="db-thread", daemon=True)
+        self._thread.start()
+        if self.read_pool_size:
+            self._read_pool = ThreadPoolExecutor(
+                max_workers=self.read_pool_size, thread_name_prefix="db-reader"
+            )
+
+    def _connect(self, database: str, uri: bool = False):
+        if self.observer is None:
+            return sqlite3.connect(database, uri=uri, check_same_thread=False, isolation_level=None)
+        conn = sqlite3.connect(
+            database, uri=uri, check_same_thread=False, isolation_level=None, factory=ObservedConnection
+        )
+        conn.observer = self.observer
+        return conn
+
+    def _apply_tuning(self, conn):
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA busy_timeout = 5000")
+
+    def _configure_writer(self, conn):
+        # Sirf nayi (khaali) file par asar karta hai - maintenance phir incremental_vacuum chala sakta hai
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if self.storage_mode == 'wal':
+            mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if mode.lower() != 'wal' and self.path != ':memory:':
+                logging.warning(f"WAL not available for {self.path}, journal mode is {mode}")
+            conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+            self._apply_tuning(conn)
+        else:
+            conn.execute("PRAGMA journal_mode = DELETE")
+
+    def _reader_connection(self):
+        """Per-thread read-only connection for the read pool"""
+        conn = getattr(self._read_local, 'conn', None)
+        if conn is None:
+            # ?, # ya % wala path URI mein escape hona chahiye
+            conn = self._connect(f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro", uri=True)
+            conn.execute("PRAGMA query_only = ON")
+            self._apply_tuning(conn)
+            self._read_local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return conn
+
+    def close(self):
+        """Finish queued requests, stop the DB thread and close all connections"""
+        if self._thread is None:
+            return
+        if self._read_pool is not None:
+            self._read_pool.shutdown(wait=True)
+            self._read_pool = None
+            with self._read_conns_lock:
+                for conn in self._read_conns:
+                    conn.close()
+                self._read_conns.clear()
+        self._requests.put(None)
+        self._thread.join()
+        self._thread = None
+        self._conn.close()
+        self._conn = None
+
+    def _worker(self):
+        """DB thread loop - jo writes saath aate hain woh ek hi transaction mein commit hote hain"""
+        conn = self._conn
+        running = True
+        pending = None
+        while running:
+            item = pending if pending is not None else self._requests.get()
+            pending = None
+            if item is None:
+                break
+            if not item[2]:
+                self._run_batch(conn, [item], write=False)
+                continue
+            batch = [item]
+            running, pending = self._collect_batch(batch)
+            self._run_batch(conn, batch, write=True)
+
+    def _collect_batch(self, batch):
+        """Gather more queued writes for up to commit_max_delay
+
+        Returns (running, pending): running is False if close() was requested; pending is
+        a non-write request that ended the batch - it runs after COMMIT, never inside the
+        write transaction (maintain() tasks like checkpoints and VACUUM need that).
+        """
+        deadline = time.monotonic() + self.commit_max_delay
+        while len(batch) < self.commit_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    item = self._requests.get(timeout=timeout)
+                else:
+                    item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return False, None
+            if not item[2]:
+                return True, item
+            batch.append(item)
+        return True, None
+
+    def _run_batch(self, conn, batch, write: bool):
+        """Run requests in one transaction (savepoint per request) and resolve after COMMIT"""
+        live = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not live:
+            return
+        if not write:
+            fn, future, _ = live[0]
+            try:
+                future.set_result(fn(conn))
+            except BaseException as e:
+                future.set_exception(e)
+            return
+        
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future, _ in live:
+                # Ek request fail ho to sirf uska kaam rollback hota hai, baaki batch commit hota hai
+                conn.execute("SAVEPOINT batch_item")
+                try:
+                    outcomes.append((future, True, fn(conn)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO batch_item")
+                    outcomes.append((future, False, e))
+                conn.execute("RELEASE batch_item")
+            conn.execute("COMMIT")
+        except BaseException as e:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error as rollback_error:
+                    logging.error(f"Rollback error: {rollback_error}")
+            for _, future, _ in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self.commits += 1
+        self.committed_requests += len(live)
+        # Reply tabhi jab data commit (durable) ho chuka ho
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _submit(self, fn, write: bool) -> Future:
+        if self._thread is None:
+            raise RuntimeError("Database is not started")
+        future = Future()
+        self._requests.put((fn, future, write))
+        return future
+
+    async def warm_up(self, statements):
+        """Open every read connection and compile hot statements before the first request
+
+        statements = [(sql, params)], read-only. sqlite3 caches compiled statements per
+        connection by SQL text, so the first real query on each connection skips parsing.
+        """
+        def prepare(conn):
+            for sql, params in statements:
+                conn.execute(sql, params).fetchall()
+
+        futures = [self._submit(prepare, False)]
+        if self._read_pool is not None:
+            # Barrier - har task alag reader thread par chale, taaki saare connections khul jaayein
+            barrier = threading.Barrier(self.read_pool_size)
+
+            def prepare_reader():
+                prepare(self._reader_connection())
+                try:
+                    barrier.wait(timeout=5)
+                except threading.BrokenBarrierError:
+                    pass
+
+            futures += [self._read_pool.submit(prepare_reader) for _ in range(self.read_pool_size)]
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+    def run_sync(self, fn, write: bool = True):
+        """Run fn(conn) on the DB thread and block until done (startup only)"""
+        return self._submit(fn, write).result()
+
+    async def transaction(self, fn):
+        """Run fn(conn) inside one transaction on the DB thread and return its result"""
+        return await asyncio.wrap_future(self._submit(fn, True))
+
+    async def maintain(self, fn):
+        """Run fn(conn) on the writer connection outside any transaction (ANALYZE, checkpoints, vacuum)"""
+        return await asyncio.wrap_future(self._submit(fn, False))
+
+    async def execute(self, sql: str, params=()) -> int:
+        """Run a single write statement and return the number of rows changed"""
+        return await self.transaction(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def read(self, fn):
+        """Run fn(conn) for a read - on the read pool in WAL mode, else on the DB thread"""
+        if self._read_pool is None:
+            return await asyncio.wrap_future(self._submit(fn, False))
+        return await asyncio.wrap_future(
+            self._read_pool.submit(lambda: fn(self._reader_connection()))
+        )
+
+    async def fetchone(self, sql: str, params=()):
+        """Run a read query and return the first row (or None)"""
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params=()):
+        """Run a read query and return all rows"""
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
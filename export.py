@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV export
+Withdrawals (pending/paid), users aur referrals keyset pagination se chunks mein likhe jaate
+hain - poori table kabhi memory mein nahi aati. /export admin command aur yeh CLI dono
+yahi functions use karte hain.
+
+Usage:
+    python export.py withdrawals --status pending --out pending.csv
+    python export.py users --db /data/internet_bot.db > users.csv
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+from urllib.request import pathname2url
+
+WITHDRAWAL_STATUSES = ('pending', 'paid')
+CHUNK_SIZE = 1000
+
+# query ka pehla column keyset key hai; {where} mein optional filter aata hai
+ExportSpec = namedtuple("ExportSpec", ["columns", "query"])
+
+EXPORTS = {
+    "withdrawals": ExportSpec(
+        ("id", "user_id", "username", "amount", "upi_id", "status", "requested_at", "processed_at"),
+        "SELECT w.id, w.user_id, u.username, w.amount, w.upi_id, w.status, w.requested_at, w.processed_at "
+        "FROM withdrawals w LEFT JOIN users u ON u.user_id = w.user_id "
+        "WHERE {where} w.id > ? ORDER BY w.id LIMIT ?",
+    ),
+    "users": ExportSpec(
+        ("user_id", "username", "first_name", "referral_code", "referred_by", "referral_count", "balance",
+         "joined_channel", "app_access", "withdrawal_access", "joined_date"),
+        "SELECT user_id, username, first_name, referral_code, referred_by, referral_count, balance, "
+        "joined_channel, app_access, withdrawal_access, joined_date "
+        "FROM users WHERE {where} user_id > ? ORDER BY user_id LIMIT ?",
+    ),
+    "referrals": ExportSpec(
+        ("id", "referrer_id", "referred_id", "referral_date"),
+        "SELECT id, referrer_id, referred_id, referral_date FROM referrals WHERE {where} id > ? ORDER BY id LIMIT ?",
+    ),
+}
+
+
+def iter_rows(conn, kind: str, status: str = None, chunk_size: int = CHUNK_SIZE):
+    """Yield rows of an export in key order, one keyset-paginated chunk at a time"""
+    spec = EXPORTS[kind]
+    where, params = "", ()
+    if status is not None:
+        if kind != "withdrawals" or status not in WITHDRAWAL_STATUSES:
+            raise ValueError(f"Unknown status filter for {kind}: {status}")
+        where, params = "w.status = ? AND", (status,)
+    sql = spec.query.format(where=where)
+    last = -(2 ** 63)
+    while True:
+        rows = conn.execute(sql, params + (last, chunk_size)).fetchall()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+
+def _cell(value):
+    # Spreadsheet formula injection se bachao - user text (username, UPI ID) =,+,-,@ se shuru na ho
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def write_csv(conn, kind: str, out, status: str = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write an export to a text file object; returns the number of data rows"""
+    writer = csv.writer(out)
+    writer.writerow(EXPORTS[kind].columns)
+    count = 0
+    for row in iter_rows(conn, kind, status, chunk_size):
+        writer.writerow([_cell(value) for value in row])
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export bot data to CSV without loading whole tables")
+    parser.add_argument("kind", choices=sorted(EXPORTS))
+    parser.add_argument("--status", choices=WITHDRAWAL_STATUSES, help="withdrawals only")
+    parser.add_argument("--db", default=os.environ.get('DATABASE_PATH', '/tmp/internet_bot.db'))
+    parser.add_argument("--out", default="-", help="output file (default stdout)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # Read-only - bot chalte hue bhi safe (WAL mode mein writer ko block nahi karta)
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(args.db))}?mode=ro", uri=True)
+    try:
+        if args.out == "-":
+            # Names mein emoji / non-Latin text - locale jo bhi ho, CSV UTF-8 hi rahe
+            sys.stdout.reconfigure(encoding="utf-8", newline="")
+            count = write_csv(conn, args.kind, sys.stdout, args.status, args.chunk_size)
+        else:
+            with open(args.out, "w", newline="", encoding="utf-8") as out:
+                count = write_csv(conn, args.kind, out, args.status, args.chunk_size)
+    finally:
+        conn.close()
+    print(f"✅ Exported {count} {args.kind} rows", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Local Telegram Bot API stand-in
+Load tests ke liye - bot ko TELEGRAM_BASE_URL se is server par point karo. getUpdates hamari
+queue se updates deta hai (long polling ke saath) ya deliver_to() ke baad webhook URL par POST
+hote hain; baaki methods turant fake results dete hain
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qs
+
+import httpx
+
+from http_server import HTTPServer, Response
+
+BOT_ID = 1000
+BOT_USERNAME = "fake_bot"
+
+
+def api_result(method: str, params: dict, message_id: int, member_status: str = "member"):
+    """Plausible `result` payload for a Bot API method (True for anything we don't model)"""
+    if method == 'getMe':
+        return {"id": BOT_ID, "is_bot": True, "first_name": "Fake", "username": BOT_USERNAME}
+    if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+        return {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": params.get("chat_id", 1), "type": "private"},
+            "text": str(params.get("text", "")),
+        }
+    if method == 'getChatMember':
+        return {"status": member_status, "user": {"id": params.get("user_id", 1), "is_bot": False, "first_name": "U"}}
+    if method == 'getWebhookInfo':
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+    return True
+
+
+def _decode(value: str):
+    # python-telegram-bot form fields mein non-string values JSON-encoded hote hain
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _json_response(status: int, payload: dict) -> Response:
+    return Response(status, json.dumps(payload).encode(), "application/json")
+
+
+class FakeBotAPI:
+    """Bot API HTTP server for one token, serving /bot<token>/<method>
+
+    push_update() queues an update for getUpdates (or for webhook delivery after deliver_to()).
+    Every other call is counted in `calls`
+    and answered locally. answerCallbackQuery latency (push -> answer) is kept per callback,
+    which gives an exact end-to-end number for button taps.
+    """
+
+    def __init__(self, token: str, host: str = "127.0.0.1", port: int = 0,
+                 member_status: str = "member", latency_ms: float = 0):
+        self.token = token
+        self.member_status = member_status
+        self.latency = latency_ms / 1000
+        self.server = HTTPServer(host, port, max_connections=1000)
+        self.server.fallback = self.handle
+        self.calls = Counter()
+        self.callback_latencies = []
+        self.first_push = 0.0
+        self.last_call = 0.0
+        self.pushed = 0
+        self._updates = deque()
+        self.next_update_id = 1
+        self._message_id = 0
+        self._pushed_at = {}
+        self._new_updates = None
+        self.polling = None
+        self._in_flight = 0
+        self._deliveries = []
+        self._client = None
+
+    @property
+    def base_url(self) -> str:
+        """Value for TELEGRAM_BASE_URL (python-telegram-bot appends the token)"""
+        return f"http://{self.server.host}:{self.server.port}/bot"
+
+    async def start(self):
+        self._new_updates = asyncio.Event()
+        self.polling = asyncio.Event()
+        await self.server.start()
+
+    async def stop(self):
+        for task in self._deliveries:
+            task.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        self._deliveries = []
+        if self._client is not None:
+            await self._client.aclose()
+        await self.server.stop()
+
+    def deliver_to(self, url: str, max_connections: int = 40, secret_token: str = ""):
+        """Webhook mode - POST queued updates to url over up to max_connections connections, like Telegram"""
+        self._client = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=max_connections))
+        headers = {"x-telegram-bot-api-secret-token": secret_token} if secret_token else {}
+        self._deliveries = [
+            asyncio.create_task(self._deliver(url, headers)) for _ in range(max_connections)
+        ]
+
+    async def _deliver(self, url: str, headers: dict):
+        while True:
+            if not self._updates:
+                self._new_updates.clear()
+                await self._new_updates.wait()
+                continue
+            update = self._updates.popleft()
+            self._in_flight += 1
+            try:
+                while True:
+                    try:
+                        response = await self._client.post(url, json=update, headers=headers)
+                        if response.status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    # Telegram bhi fail hone par dobara bhejta hai
+                    await asyncio.sleep(0.1)
+            finally:
+                self._in_flight -= 1
+
+    def push_update(self, update: dict):
+        """Queue an update dict and wake a waiting getUpdates
+
+        update_ids must increase - build updates with next_update_id.
+        """
+        if update["update_id"] < self.next_update_id:
+            raise ValueError(f"update_id {update['update_id']} is not above the last pushed one")
+        self.next_update_id = update["update_id"] + 1
+        now = time.monotonic()
+        if not self.pushed:
+            self.first_push = now
+        self.pushed += 1
+        callback = update.get("callback_query")
+        if callback is not None:
+            self._pushed_at[str(callback["id"])] = now
+        self._updates.append(update)
+        self._new_updates.set()
+
+    def pending(self) -> int:
+        """Updates not yet confirmed by the bot (getUpdates offset or webhook 200)"""
+        return len(self._updates) + self._in_flight
+
+    async def handle(self, request):
+        prefix, _, method = request.path.rpartition('/')
+        if prefix != f"/bot{self.token}":
+            return _json_response(401, {"ok": False, "error_code": 401, "description": "Unauthorized"})
+        params = self._params(request)
+        if method == 'getUpdates':
+            return _json_response(200, {"ok": True, "result": await self._get_updates(params)})
+
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == 'answerCallbackQuery':
+            pushed_at = self._pushed_at.pop(str(params.get("callback_query_id")), None)
+            if pushed_at is not None:
+                self.callback_latencies.append(time.monotonic() - pushed_at)
+        if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+            self._message_id += 1
+        self.last_call = time.monotonic()
+        return _json_response(200, {"ok": True, "result": api_result(method, params, self._message_id, self.member_status)})
+
+    @staticmethod
+    def _params(request) -> dict:
+        params = {key: _decode(values[-1]) for key, values in request.query.items()}
+        content_type = request.headers.get('content-type', '')
+        if content_type.startswith('application/json') and request.body:
+            params.update(json.loads(request.body))
+        elif content_type.startswith('application/x-www-form-urlencoded'):
+            for key, values in parse_qs(request.body.decode(), keep_blank_values=True).items():
+                params[key] = _decode(values[-1])
+        # multipart (file uploads) - sirf count hota hai, body parse nahi karte
+        return params
+
+    async def _get_updates(self, params: dict):
+        self.polling.set()
+        offset = int(params.get("offset") or 0)
+        limit = min(int(params.get("limit") or 100), 100)
+        timeout = float(params.get("timeout") or 0)
+        # offset se pehle wale updates bot confirm kar chuka hai
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = []
+        for update in self._updates:
+            if len(batch) >= limit:
+                break
+            if update["update_id"] >= offset:
+                batch.append(update)
+        return batch
@@ -0,0 +1,129 @@
+"""
+Incoming flood control
+Handlers se pehle chalne wala gate - ek user (ya script) ke lagataar taps/commands DB aur
+Bot API capacity na khaayein. Per-user token bucket + same action ka debounce.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop
+
+from ratelimit import KeyedTokenBuckets
+
+SLOW_DOWN_TEXT = "⏳ Too many requests - please slow down for a few seconds."
+
+
+def action_key(update):
+    """What the user asked for - (button data, message id) or command text; None for other updates"""
+    query = update.callback_query
+    if query is not None:
+        # Alag messages par same button alag screens badalta hai
+        return query.data, query.message.message_id if query.message is not None else None
+    message = update.message
+    if message is not None and message.text and message.text.startswith('/'):
+        return message.text
+    return None
+
+
+class FloodControl:
+    """TypeHandler callback that stops abusive updates before any handler runs
+
+    - Repeating the user's last accepted action (same button on the same message, same
+      command) within `debounce` seconds is dropped - the screen it would show is already
+      on screen. The first dropped tap of a streak is answered so the client's spinner
+      stops; the rest are dropped silently. Buttons in `exempt_actions` (state checks like
+      Verify, where a repeat can have a different result) are never debounced.
+    - Every other update takes a token from the user's bucket (`rate` per second, `burst`
+      stored). Without a token the update is dropped; the first one of a throttled streak
+      gets a "slow down" notice, the rest are dropped silently.
+
+    Raises ApplicationHandlerStop to skip the remaining handler groups. Users in `exempt`
+    (admins) are never limited.
+    """
+
+    def __init__(self, rate: float, burst: float, debounce: float, exempt=frozenset(),
+                 exempt_actions=frozenset(), max_keys: int = 50000):
+        self.buckets = KeyedTokenBuckets(rate, burst, max_keys) if rate > 0 else None
+        self.debounce = debounce
+        self.exempt = exempt
+        self.exempt_actions = exempt_actions
+        self.max_keys = max_keys
+        # user_id -> (last accepted action, time), oldest first
+        self._recent = OrderedDict()
+        self._warned = set()
+        self._answered = set()
+        self.passed = 0
+        self.debounced = 0
+        self.throttled = 0
+
+    async def check(self, update, context):
+        user = update.effective_user
+        # chat_member updates channel ke events hain, user ke taps nahi
+        if user is None or user.id in self.exempt or update.chat_member is not None:
+            return
+        now = time.monotonic()
+        action = action_key(update) if self.debounce > 0 else None
+        if action is not None and update.callback_query is not None and action[0] in self.exempt_actions:
+            action = None
+        if action is not None:
+            last = self._recent.get(user.id)
+            if last is not None and last[0] == action and now - last[1] < self.debounce:
+                self.debounced += 1
+                if update.callback_query is not None and user.id not in self._answered:
+                    if len(self._answered) >= self.max_keys:
+                        self._answered.clear()
+                    self._answered.add(user.id)
+                    await self._answer(update.callback_query)
+                raise ApplicationHandlerStop
+
+        if self.buckets is not None and self.buckets.take(user.id, now) > 0:
+            self.throttled += 1
+            if user.id not in self._warned:
+                if len(self._warned) >= self.max_keys:
+                    self._warned.clear()
+                self._warned.add(user.id)
+                await self._notify(update)
+            raise ApplicationHandlerStop
+
+        self._warned.discard(user.id)
+        self._answered.discard(user.id)
+        self.passed += 1
+        if action is not None:
+            self._remember(user.id, action, now)
+
+    def _remember(self, user_id: int, action, now: float):
+        self._recent[user_id] = (action, now)
+        self._recent.move_to_end(user_id)
+        # Debounce window se purani entries aage hoti hain
+        while self._recent:
+            oldest_user, (_, oldest) = next(iter(self._recent.items()))
+            if now - oldest < self.debounce and len(self._recent) <= self.max_keys:
+                break
+            del self._recent[oldest_user]
+
+    @staticmethod
+    async def _answer(query, text: str = None):
+        try:
+            await query.answer(text)
+        except TelegramError as e:
+            logging.debug(f"answerCallbackQuery failed: {e}")
+
+    async def _notify(self, update):
+        if update.callback_query is not None:
+            await self._answer(update.callback_query, SLOW_DOWN_TEXT)
+        elif update.message is not None:
+            try:
+                await update.message.reply_text(SLOW_DOWN_TEXT)
+            except TelegramError as e:
+                logging.debug(f"Slow down notice failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "passed": self.passed,
+            "debounced": self.debounced,
+            "throttled": self.throttled,
+            "tracked_users": len(self.buckets) if self.buckets is not None else 0,
+        }
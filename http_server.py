@@ -0,0 +1,167 @@
+"""
+Minimal asyncio HTTP/1.1 server
+Webhook aur local endpoints ke liye - koi extra dependency nahi, bot ke event loop par hi chalta hai
+"""
+
+import asyncio
+import logging
+from collections import namedtuple
+from urllib.parse import parse_qs, urlsplit
+
+Request = namedtuple("Request", ["method", "path", "query", "headers", "body"])
+Response = namedtuple("Response", ["status", "body", "content_type"])
+
+REASONS = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 413: "Payload Too Large", 429: "Too Many Requests",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class RequestError(Exception):
+    """Request can't be served - answered with `status` and the connection is closed"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def text_response(status: int, text: str = "", content_type: str = "text/plain; charset=utf-8") -> Response:
+    return Response(status, text.encode(), content_type)
+
+
+class HTTPServer:
+    """Routes (method, path) to async handlers: handler(Request) -> Response
+
+    Keep-alive connections are supported; at most max_connections are served at once,
+    extra connections wait for a free slot. Requests matching no route go to `fallback`
+    if one is set (e.g. path-parameter APIs), else get 404/405.
+
+    Slow or idle clients can't hold a slot: a keep-alive connection with no new request
+    within idle_timeout is closed, and a started request must arrive completely (headers
+    and body) within request_timeout or gets 408. Headers are capped at max_headers lines
+    and max_header_bytes in total (431).
+    """
+
+    def __init__(self, host: str, port: int, max_connections: int = 100, max_body: int = 1024 * 1024,
+                 request_timeout: float = 10, idle_timeout: float = 15, max_headers: int = 100,
+                 max_header_bytes: int = 16 * 1024):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self.max_headers = max_headers
+        self.max_header_bytes = max_header_bytes
+        self.routes = {}
+        self.fallback = None
+        self._slots = asyncio.Semaphore(max_connections)
+        self._server = None
+
+    def route(self, method: str, path: str, handler):
+        self.routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        # limit - ek line is se lambi ho to readline() ValueError deta hai, poori buffer nahi bharti
+        self._server = await asyncio.start_server(
+            self._serve_connection, self.host, self.port, limit=self.max_header_bytes
+        )
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader):
+        """Next request on the connection, None if the client closed it or stayed idle"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            return None
+        if not request_line:
+            return None
+        try:
+            return await asyncio.wait_for(self._read_rest(reader, request_line), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise RequestError(408, "request timeout") from None
+
+    async def _read_rest(self, reader, request_line: bytes) -> Request:
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise RequestError(400, "bad request") from None
+        headers = {}
+        size = len(request_line)
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise RequestError(431, "header too large") from None
+            if line in (b'\r\n', b'\n', b''):
+                break
+            size += len(line)
+            if len(headers) >= self.max_headers or size > self.max_header_bytes:
+                raise RequestError(431, "too many headers")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise RequestError(400, "bad content-length") from None
+        if length < 0:
+            raise RequestError(400, "bad content-length")
+        if length > self.max_body:
+            raise RequestError(413, "body too large")
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+
+    async def _serve_connection(self, reader, writer):
+        async with self._slots:
+            try:
+                while True:
+                    try:
+                        request = await self._read_request(reader)
+                    except RequestError as e:
+                        await self._write(writer, text_response(e.status, str(e)), close=True)
+                        break
+                    except (ValueError, asyncio.IncompleteReadError):
+                        await self._write(writer, text_response(400, "bad request"), close=True)
+                        break
+                    if request is None:
+                        break
+                    response = await self._dispatch(request)
+                    close = request.headers.get('connection', '').lower() == 'close'
+                    await self._write(writer, response, close)
+                    if close:
+                        break
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                writer.close()
+
+    async def _dispatch(self, request) -> Response:
+        handler = self.routes.get((request.method, request.path)) or self.fallback
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return text_response(405, "method not allowed")
+            return text_response(404, "not found")
+        try:
+            return await handler(request)
+        except Exception as e:
+            logging.error(f"HTTP handler error on {request.path}: {e}")
+            return text_response(500, "error")
+
+    @staticmethod
+    async def _write(writer, response: Response, close: bool):
+        head = (
+            f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'OK')}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Content-Length: {len(response.body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + response.body)
+        await writer.drain()
@@ -5,27 +5,142 @@ INTERNET SELL APP BOT - RENDER COMPATIBLE
 Withdrawal after 10 referrals only
 """
 
+import time
+
+STARTED_AT = time.perf_counter()
+
 import os
-import sqlite3
+import re
 import logging
-import secrets
-import string
+import sqlite3
+import sys
 import asyncio
+import tempfile
 
-# Render compatible imports
-try:
-    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-    from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-except ImportError:
-    print("Installing required packages...")
-    import subprocess
-    subprocess.run(["pip", "install", "python-telegram-bot==20.7"])
-    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-    from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+# Packages build step par requirements.txt se install hote hain - runtime par pip kabhi nahi
+from telegram import Bot, Update
+from telegram.ext import (
+    Application, ChatMemberHandler, CommandHandler, CallbackQueryHandler, ContextTypes, TypeHandler
+)
+
+from database import Database, HAS_RETURNING
+from cache import USER_STATE_COLUMNS, UserState, UserStateCache, load_user_state
+from userstore import UserStore
+import screens
+import migrations
+from referral_codes import ReferralCodeGenerator, load_key
+from concurrency import KeyedLocks, PerUserUpdateProcessor
+from webhook import serve_webhook
+from notifier import Notifier
+from metrics import InstrumentedRequest, Metrics, MetricsExporter, PhaseTimer
+from telegram.request import HTTPXRequest
+from traces import TraceRecorder
+from router import CallbackRouter
+from stats import TOP_PAGE_SIZE, load_stats, top_referrers
+from referral_graph import downline, resolve_user, upline
+from export import WITHDRAWAL_STATUSES, write_csv
+from sharding import ShardPeers, run_cluster
+from floodcontrol import FloodControl
+from signups import SignupIndex
+import maintenance
+from maintenance import MaintenanceScheduler
+from membership import ChannelMembership, parse_chat_id
 
 # Configuration - Environment variables se lego
 BOT_TOKEN = os.environ.get('BOT_TOKEN', '8319114937:AAFFIwvLP3FHtJmMJ-C-9ILQ3U-oFfAdOGk')
 CHANNEL_LINK = "https://t.me/+kTvYd3_mSbs2MWNl"
+# Channel ka id (-100...) ya @username - bot channel admin ho to Verify Join asli membership check
+# karta hai aur join/leave events aate hain; khaali = purana behaviour (bina check ke verify)
+CHANNEL_ID = parse_chat_id(os.environ.get('CHANNEL_ID', ''))
+MEMBERSHIP_TTL = float(os.environ.get('MEMBERSHIP_TTL', '3600'))
+# Background re-checks (getChatMember) per second
+MEMBERSHIP_RECHECK_RATE = float(os.environ.get('MEMBERSHIP_RECHECK_RATE', '5'))
+MEMBERSHIP_CACHE_SIZE = int(os.environ.get('MEMBERSHIP_CACHE_SIZE', '100000'))
+# Bot API base URL - khaali = api.telegram.org; load tests mein fake_bot_api ka URL (".../bot")
+TELEGRAM_BASE_URL = os.environ.get('TELEGRAM_BASE_URL', '')
+# Har incoming message/tap ko compact trace file mein likho (load test replay ke liye)
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+
+# Admin user ids (comma separated) - /stats, /top
+ADMIN_IDS = frozenset(int(x) for x in os.environ.get('ADMIN_IDS', '').replace(',', ' ').split())
+
+# Database - Render par persistent disk ka path DATABASE_PATH mein do
+DATABASE_PATH = os.environ.get('DATABASE_PATH', '/tmp/internet_bot.db')
+DB_STORAGE_MODE = os.environ.get('DB_STORAGE_MODE', 'wal')  # 'wal' ya 'legacy'
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', '4'))
+DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', '16384'))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', str(64 * 1024 * 1024)))
+DB_COMMIT_MAX_DELAY_MS = float(os.environ.get('DB_COMMIT_MAX_DELAY_MS', '2'))
+DB_COMMIT_BATCH_SIZE = int(os.environ.get('DB_COMMIT_BATCH_SIZE', '100'))
+
+# User state cache - menu taps memory se serve hote hain
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '100000'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '300'))
+# 'cache' (LRU upar wala) ya 'memory' - saare users compact arrays mein; clean shutdown par snapshot
+USER_STORE = os.environ.get('USER_STORE', 'cache')
+USER_STORE_PATH = os.environ.get('USER_STORE_PATH', DATABASE_PATH + '.users')
+
+# Ek saath kitne updates process hon (1 = purana sequential mode)
+CONCURRENT_UPDATES = int(os.environ.get('CONCURRENT_UPDATES', '32'))
+
+# Outgoing notifications - Telegram limits: ~30 msg/sec total, ~1 msg/sec per chat
+NOTIFIER_WORKERS = int(os.environ.get('NOTIFIER_WORKERS', '4'))
+NOTIFY_GLOBAL_RATE = float(os.environ.get('NOTIFY_GLOBAL_RATE', '30'))
+NOTIFY_PER_CHAT_RATE = float(os.environ.get('NOTIFY_PER_CHAT_RATE', '1'))
+
+# Incoming flood control - per user FLOOD_RATE updates/sec (FLOOD_BURST tak jama), 0 = band;
+# same message ka same button / same command FLOOD_DEBOUNCE sec ke andar dobara aaye to drop
+FLOOD_RATE = float(os.environ.get('FLOOD_RATE', '2'))
+FLOOD_BURST = float(os.environ.get('FLOOD_BURST', '8'))
+FLOOD_DEBOUNCE = float(os.environ.get('FLOOD_DEBOUNCE', '1'))
+# State check wale buttons - dobara tap ka result alag ho sakta hai (abhi join kiya), debounce nahi
+FLOOD_DEBOUNCE_EXEMPT = frozenset({"verify_join"})
+
+# Database maintenance (JobQueue) - har MAINTENANCE_CHECK_INTERVAL sec par due tasks, sirf jab
+# handlers MAINTENANCE_QUIET_RATE calls/sec se kam hon aur p95 MAINTENANCE_MAX_P95_MS se neeche; 0 = band
+MAINTENANCE_CHECK_INTERVAL = float(os.environ.get('MAINTENANCE_CHECK_INTERVAL', '60'))
+MAINTENANCE_QUIET_RATE = float(os.environ.get('MAINTENANCE_QUIET_RATE', '2'))
+MAINTENANCE_MAX_P95_MS = float(os.environ.get('MAINTENANCE_MAX_P95_MS', '250'))
+# Itni der tak busy rehne par bhi task chala do (latency theek ho to)
+MAINTENANCE_MAX_DEFER = float(os.environ.get('MAINTENANCE_MAX_DEFER', '21600'))
+
+# Serving mode - 'polling' (default), 'webhook' ya 'sharded' (dispatcher + N webhook workers, ek box par)
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', os.environ.get('PORT', '8443')))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+# Public base URL (Render khud RENDER_EXTERNAL_URL deta hai); khaali = setWebhook skip (local testing)
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', os.environ.get('RENDER_EXTERNAL_URL', ''))
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Sharded mode - workers 127.0.0.1:SHARD_BASE_PORT+i par; SHARD_INDEX/SHARD_SECRET supervisor khud set karta hai
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', str(os.cpu_count() or 1)))
+SHARD_INDEX = int(os.environ.get('SHARD_INDEX', '-1'))
+SHARD_BASE_PORT = int(os.environ.get('SHARD_BASE_PORT', '9100'))
+SHARD_SECRET = os.environ.get('SHARD_SECRET', '')
+
+# Metrics - Prometheus text format GET /metrics par (0 = endpoint band), log summary har N sec (0 = band)
+METRICS_LISTEN = os.environ.get('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+METRICS_LOG_INTERVAL = float(os.environ.get('METRICS_LOG_INTERVAL', '0'))
+
+# Naye referral codes ki length (7 = ~78 billion codes, purane 6-char codes se alag)
+REFERRAL_CODE_LENGTH = int(os.environ.get('REFERRAL_CODE_LENGTH', '7'))
+
+# UPI ID format: handle@bank
+UPI_ID_PATTERN = re.compile(r"^[\w.\-]{2,256}@[A-Za-z][A-Za-z0-9]{1,63}$")
+
+# Startup phases ka time (imports se "ready" tak)
+STARTUP = PhaseTimer(STARTED_AT)
+STARTUP.mark("imports", STARTED_AT)
+
+# Har request par chalne wali reads - startup par har connection par compile kar lete hain
+HOT_STATEMENTS = [
+    (f"SELECT {USER_STATE_COLUMNS} FROM users WHERE user_id = ?", (0,)),
+    ("SELECT user_id FROM users WHERE referral_code = ?", ("",)),
+]
 
 # Setup logging
 logging.basicConfig(
@@ -34,67 +149,357 @@ logging.basicConfig(
 )
 
 class RenderInternetBot:
-    def __init__(self, token: str):
-        self.application = Application.builder().token(token).build()
+    def __init__(self, token: str, request=None):
+        """request: optional telegram.request.BaseRequest (benchmarks pass a fake one)"""
+        begin = time.perf_counter()
+        # Per-user locks - ek user ke updates (aur uske referral credits) ek-ek karke chalte hain
+        self.user_locks = KeyedLocks()
+        self.metrics = Metrics()
+        # Har Bot API call ka time - default HTTPXRequest (ya diya gaya fake) ke upar wrapper
+        request = InstrumentedRequest(request or HTTPXRequest(connection_pool_size=256), self.metrics)
+        builder = (
+            Application.builder().token(token)
+            .post_init(self.on_startup)
+            .post_stop(self.on_stop)
+            .post_shutdown(self.on_shutdown)
+            .request(request)
+        )
+        if TELEGRAM_BASE_URL:
+            builder = builder.base_url(TELEGRAM_BASE_URL)
+        if CONCURRENT_UPDATES > 1:
+            builder = builder.concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES, self.user_locks))
+        if BOT_MODE == 'webhook':
+            # Webhook mode mein updates hamara receiver deta hai, Updater (getUpdates) nahi chahiye
+            builder = builder.updater(None)
+        self.application = builder.build()
+        self.notifier = Notifier(
+            self.application.bot,
+            workers=NOTIFIER_WORKERS,
+            global_rate=NOTIFY_GLOBAL_RATE,
+            per_chat_rate=NOTIFY_PER_CHAT_RATE,
+        )
+        self.trace_recorder = TraceRecorder(TRACE_FILE) if TRACE_FILE else None
+        self.membership = None
+        if CHANNEL_ID is not None:
+            self.membership = ChannelMembership(
+                self.application.bot, CHANNEL_ID, self.on_membership_change,
+                ttl=MEMBERSHIP_TTL, recheck_rate=MEMBERSHIP_RECHECK_RATE, max_size=MEMBERSHIP_CACHE_SIZE,
+            )
+        self.flood_control = FloodControl(
+            FLOOD_RATE, FLOOD_BURST, FLOOD_DEBOUNCE, exempt=ADMIN_IDS, exempt_actions=FLOOD_DEBOUNCE_EXEMPT
+        )
+        # Sharded worker - dusre shards ke users ke referral side effects unke owner ko jaate hain
+        self.shards = None
+        if SHARD_INDEX >= 0 and SHARD_COUNT > 1:
+            self.shards = ShardPeers(SHARD_INDEX, SHARD_COUNT, SHARD_BASE_PORT, SHARD_SECRET)
+        if USER_STORE == 'memory':
+            # Sharded worker sirf apne users rakhta hai aur har start par users table se bharta hai -
+            # worker band rehte dusre shards ne uske users ko credit kiya ho sakta hai
+            self.user_cache = UserStore(
+                path=None if self.shards else USER_STORE_PATH,
+                code_width=max(REFERRAL_CODE_LENGTH, 8),
+                owns=self.shards.owns if self.shards else None,
+            )
+        else:
+            self.user_cache = UserStateCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        self.signups = SignupIndex(owns=self.shards.owns if self.shards else None)
+        self.screens = screens.ScreenPresenter()
+        self.callbacks = CallbackRouter()
+        self.channel_keyboard = screens.channel_join_keyboard(CHANNEL_LINK)
+        self.metrics_exporter = MetricsExporter(
+            self.metrics, listen=METRICS_LISTEN, port=METRICS_PORT, log_interval=METRICS_LOG_INTERVAL
+        )
+        STARTUP.mark("application", begin)
         self.setup_database()
-        self.setup_handlers()
+        with STARTUP.phase("handlers"):
+            self.setup_metrics()
+            self.setup_handlers()
+            self.setup_maintenance()
+        # on_startup yahan se initialize (getMe) ka time naapta hai
+        self.constructed_at = time.perf_counter()
         print("🤖 Bot initialized successfully!")
     
     def setup_database(self):
         """Database setup for Render"""
         try:
-            self.conn = sqlite3.connect('/tmp/internet_bot.db', check_same_thread=False)
-            cursor = self.conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    joined_channel BOOLEAN DEFAULT FALSE,
-                    referral_code TEXT UNIQUE,
-                    referred_by TEXT,
-                    referral_count INTEGER DEFAULT 0,
-                    balance INTEGER DEFAULT 0,
-                    app_access BOOLEAN DEFAULT FALSE,
-                    withdrawal_access BOOLEAN DEFAULT FALSE,
-                    joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS referrals (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    referrer_id INTEGER,
-                    referred_id INTEGER,
-                    referral_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            self.db = Database(
+                DATABASE_PATH,
+                storage_mode=DB_STORAGE_MODE,
+                read_pool_size=DB_READ_POOL_SIZE,
+                synchronous=DB_SYNCHRONOUS,
+                cache_size_kb=DB_CACHE_SIZE_KB,
+                mmap_size=DB_MMAP_SIZE,
+                commit_max_delay_ms=DB_COMMIT_MAX_DELAY_MS,
+                commit_batch_size=DB_COMMIT_BATCH_SIZE,
+                observer=self.metrics.observe_sql,
+            )
+            with STARTUP.phase("database"):
+                self.db.start()
+                # user_version current ho to migrate() sirf ek PRAGMA padhta hai - koi schema kaam nahi
+                for version, description in self.db.run_sync(migrations.migrate, write=False):
+                    print(f"✅ Migration {version} applied: {description}")
+                self.referral_codes = ReferralCodeGenerator(
+                    self.db.run_sync(load_key, write=False), REFERRAL_CODE_LENGTH
                 )
-            ''')
-            
-            self.conn.commit()
-            print("✅ Database setup complete!")
+            if isinstance(self.user_cache, UserStore):
+                with STARTUP.phase("user store"):
+                    source = self.db.run_sync(self.user_cache.load, write=False)
+                stats = self.user_cache.stats()
+                print(f"✅ User store loaded from {source}: {stats['size']} users, {stats['memory_mb']} MB")
+            with STARTUP.phase("signup index"):
+                try:
+                    self.db.run_sync(self.signups.load, write=False)
+                except Exception as e:
+                    # Bina index ke bhi chalta hai - /start har baar database se poochta hai
+                    print(f"⚠️ Signup index load failed: {e}")
+            stats = self.signups.stats()
+            print(f"✅ Signup index: {stats['size']} users ({stats['referred']} referred), {stats['memory_mb']} MB")
+            print(f"✅ Database setup complete! ({DATABASE_PATH}, {DB_STORAGE_MODE} mode)")
             
         except Exception as e:
             print(f"❌ Database error: {e}")
     
+    def setup_metrics(self):
+        """Gauges read from the existing stats counters at scrape time"""
+        cache = self.user_cache
+        self.metrics.gauge("bot_user_cache_size", "Cached user states", lambda: cache.stats()["size"])
+        self.metrics.gauge("bot_user_cache_hits_total", "User cache hits", lambda: cache.hits, "counter")
+        self.metrics.gauge("bot_user_cache_misses_total", "User cache misses", lambda: cache.misses, "counter")
+        self.metrics.gauge("bot_db_commits_total", "Group commits", lambda: self.db.commits, "counter")
+        self.metrics.gauge(
+            "bot_db_committed_requests_total", "Write requests committed", lambda: self.db.committed_requests, "counter"
+        )
+        self.metrics.gauge(
+            "bot_notifier_queued", "Notifications waiting to be sent", lambda: self.notifier.stats()["queued"]
+        )
+        self.metrics.gauge("bot_notifier_sent_total", "Notifications sent", lambda: self.notifier.sent, "counter")
+        self.metrics.gauge("bot_notifier_failed_total", "Notifications dropped", lambda: self.notifier.failed, "counter")
+        self.metrics.gauge(
+            "bot_callback_unknown_total", "Taps on unknown or malformed buttons", lambda: self.callbacks.unknown, "counter"
+        )
+        self.metrics.gauge(
+            "bot_flood_debounced_total", "Repeated identical actions dropped", lambda: self.flood_control.debounced, "counter"
+        )
+        self.metrics.gauge(
+            "bot_flood_throttled_total", "Updates dropped by per-user rate limit", lambda: self.flood_control.throttled, "counter"
+        )
+        self.metrics.gauge("bot_signup_index_size", "Registered users in the signup index", lambda: self.signups.size)
+        self.metrics.gauge(
+            "bot_signup_repeat_starts_total", "Deep-link /start by already registered users (no credit)",
+            lambda: self.signups.repeat_starts, "counter"
+        )
+        self.metrics.gauge(
+            "bot_signup_repeat_referred_total", "Repeat deep-link /start by already referred users",
+            lambda: self.signups.repeat_referred, "counter"
+        )
+        self.metrics.gauge(
+            "bot_skipped_edits_total", "No-op message edits skipped", lambda: self.screens.skipped_edits, "counter"
+        )
+    
+    def setup_maintenance(self):
+        """Periodic database upkeep on the JobQueue - one process per database file"""
+        self.maintenance = MaintenanceScheduler(
+            self.db, self.metrics,
+            check_interval=MAINTENANCE_CHECK_INTERVAL,
+            quiet_rate=MAINTENANCE_QUIET_RATE,
+            max_p95=MAINTENANCE_MAX_P95_MS / 1000,
+            max_defer=MAINTENANCE_MAX_DEFER,
+        )
+        if SHARD_INDEX > 0:
+            # Sab shards ek hi file share karte hain - maintenance sirf shard 0 karta hai
+            return
+        self.maintenance.add("checkpoint", 300, maintenance.checkpoint)
+        self.maintenance.add("optimize", 3600, maintenance.optimize)
+        self.maintenance.add("incremental vacuum", 3600, maintenance.incremental_vacuum)
+        self.maintenance.add("analyze", 86400, maintenance.analyze)
+        if MAINTENANCE_CHECK_INTERVAL > 0 and not self.maintenance.start(self.application.job_queue):
+            print("⚠️ JobQueue not available - install python-telegram-bot[job-queue] for database maintenance")
+    
+    async def on_startup(self, application: Application):
+        """Start background workers and warm up once the application is initialized"""
+        # initialize() ne getMe kar liya - bot ka username ab application.bot par cached hai
+        STARTUP.mark("initialize", self.constructed_at)
+        with STARTUP.phase("warm-up"):
+            tasks = [self.notifier.start(), self.metrics_exporter.start(), self.db.warm_up(HOT_STATEMENTS)]
+            if self.shards is not None:
+                tasks.append(self.shards.start())
+            if self.membership is not None:
+                tasks.append(self.membership.start())
+            await asyncio.gather(*tasks)
+        print(f"🚀 Startup: {STARTUP.report()}")
+    
+    async def on_stop(self, application: Application):
+        """Flush queued notifications while the bot can still send"""
+        if self.shards is not None:
+            await self.shards.stop()
+            print(f"📊 Shard {SHARD_INDEX}: {self.shards.remote_referrals} referrals routed to other shards")
+        if self.membership is not None:
+            await self.membership.stop()
+            print(f"📊 Channel membership: {self.membership.stats()}")
+        await self.notifier.stop()
+        print(f"📊 Notifier: {self.notifier.stats()}")
+    
+    async def on_shutdown(self, application: Application):
+        """Flush and close the database after the bot stops"""
+        print(f"📊 User cache: {self.user_cache.stats()}")
+        print(f"📊 Handlers: {self.metrics.summary()}")
+        print(f"📊 Flood control: {self.flood_control.stats()}")
+        print(f"📊 Signups: {self.signups.stats()}")
+        print(f"📊 Maintenance: {self.maintenance.stats()}")
+        if isinstance(self.user_cache, UserStore):
+            # DB thread par - saare queued writes ke baad, loop block kiye bina; wahi write sequence padhta hai
+            await self.db.maintain(self.user_cache.close)
+        await self.metrics_exporter.stop()
+        if self.trace_recorder is not None:
+            print(f"📼 Trace: {self.trace_recorder.recorded} updates written to {TRACE_FILE}")
+            self.trace_recorder.close()
+        self.db.close()
+    
     def setup_handlers(self):
         """Setup bot handlers"""
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("referral", self.referral_command))
-        self.application.add_handler(CommandHandler("balance", self.balance_command))
-        self.application.add_handler(CommandHandler("app", self.app_command))
-        self.application.add_handler(CommandHandler("withdraw", self.withdraw_command))
-        self.application.add_handler(CallbackQueryHandler(self.button_handler))
+        if self.trace_recorder is not None:
+            # Group -2 - sabse pehle (throttled updates bhi trace mein aate hain), kisi ko roke bina
+            self.application.add_handler(TypeHandler(Update, self.trace_recorder.record), group=-2)
+        # Group -1 - handlers se pehle; ApplicationHandlerStop baaki groups skip karta hai
+        self.application.add_handler(TypeHandler(Update, self.flood_control.check), group=-1)
+        timed = self.metrics.instrument_handler
+        self.application.add_handler(CommandHandler("start", timed("start", self.start_command)))
+        self.application.add_handler(CommandHandler("referral", timed("referral", self.referral_command)))
+        self.application.add_handler(CommandHandler("balance", timed("balance", self.balance_command)))
+        self.application.add_handler(CommandHandler("app", timed("app", self.app_command)))
+        self.application.add_handler(CommandHandler("withdraw", timed("withdraw", self.withdraw_command)))
+        self.application.add_handler(CommandHandler("stats", timed("stats", self.stats_command)))
+        self.application.add_handler(CommandHandler("top", timed("top", self.top_command)))
+        self.application.add_handler(CommandHandler("downline", timed("downline", self.downline_command)))
+        self.application.add_handler(CommandHandler("upline", timed("upline", self.upline_command)))
+        self.application.add_handler(CommandHandler("export", timed("export", self.export_command)))
+        self.application.add_handler(CommandHandler("markpaid", timed("markpaid", self.markpaid_command)))
+        self.application.add_handler(CallbackQueryHandler(timed("button", self.button_handler)))
+        if self.membership is not None:
+            self.application.add_handler(ChatMemberHandler(
+                timed("chat_member", self.membership.handle_update), ChatMemberHandler.CHAT_MEMBER
+            ))
+        self.setup_callbacks()
         print("✅ Handlers setup complete!")
     
-    def generate_referral_code(self):
-        """Generate unique referral code"""
+    def setup_callbacks(self):
+        """Callback data prefix -> screen handler"""
+        self.callbacks.register("verify_join", self.verify_channel_join)
+        self.callbacks.register("main_menu", self.show_main_menu_from_query)
+        self.callbacks.register("get_referral", self.show_referral_info)
+        self.callbacks.register("check_balance", self.show_balance_from_query)
+        self.callbacks.register("get_app_link", self.get_app_link)
+        self.callbacks.register("withdraw_earnings", self.withdraw_earnings)
+        self.callbacks.register("top", self.show_top_page)
+    
+    async def get_user_state(self, user_id: int):
+        """User state from the cache, falling back to the database on a miss"""
+        state = self.user_cache.get(user_id)
+        if state is None:
+            token = self.user_cache.snapshot()
+            state = await self.db.read(lambda conn: load_user_state(conn, user_id))
+            if state:
+                self.user_cache.fill(user_id, state, token)
+        return state
+    
+    def cache_user_state(self, user_id: int, state):
+        """Write-through after a write; invalidate if we couldn't read the new state"""
+        if state:
+            self.user_cache.put(user_id, state)
+        else:
+            self.user_cache.invalidate(user_id)
+    
+    def owns(self, user_id: int) -> bool:
+        """Is this process the user's shard (always True outside sharded mode)"""
+        return self.shards is None or self.shards.owns(user_id)
+    
+    def on_remote_referral(self, referrer_id: int, state):
+        """Another shard credited one of our users - drop the stale cached state and notify"""
+        self.user_cache.invalidate(referrer_id)
+        self.notifier.notify_referral(referrer_id, UserState(*state))
+    
+    async def on_membership_change(self, user_id: int, is_member: bool):
+        """Channel status changed (check or chat_member event) - keep joined_channel in step"""
+        state = await self.get_user_state(user_id)
+        if state is None or bool(state.joined_channel) == is_member:
+            return
+        await self.update_user(user_id, "UPDATE users SET joined_channel = ? WHERE user_id = ?", (is_member, user_id))
+        print(f"✅ Channel membership of {user_id}: {'joined' if is_member else 'left'}")
+    
+    async def update_user(self, user_id: int, sql: str, params=()):
+        """Run a write for one user and refresh its cached state from the same transaction"""
+        def write(conn):
+            conn.execute(sql, params)
+            return load_user_state(conn, user_id)
+        
+        state = await self.db.transaction(write)
+        self.cache_user_state(user_id, state)
+        return state
+    
+    def insert_new_user(self, conn, user_id: int, username, first_name, referred_by=None) -> bool:
+        """Insert a user with a freshly allocated referral code (runs on the DB thread)
+
+        Returns False if the user already existed.
+        """
         while True:
-            code = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE referral_code = ?", (code,))
-            if not cursor.fetchone():
-                return code
+            referral_code = self.referral_codes.next_code(conn)
+            conn.execute("SAVEPOINT new_user")
+            try:
+                inserted = conn.execute(
+                    "INSERT INTO users (user_id, username, first_name, referral_code, referred_by) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(user_id) DO NOTHING",
+                    (user_id, username, first_name, referral_code, referred_by)
+                ).rowcount == 1
+            except sqlite3.IntegrityError:
+                # Sirf purane random codes se takkar ho sakti hai - agla sequence number lo
+                conn.execute("ROLLBACK TO new_user")
+                conn.execute("RELEASE new_user")
+                continue
+            conn.execute("RELEASE new_user")
+            return inserted
+    
+    def register_user(self, conn, user_id: int, username, first_name, referral_code=None):
+        """Registration + referral credit in one transaction (runs on the DB thread)
+
+        Inserts the user, validates the referral code, records the referral edge and
+        credits the referrer (count, balance, withdrawal access) together, so a deep-link
+        signup is a single commit. Only brand-new users can be credited to a referrer.
+        Returns (user's state, (referrer_id, referrer's state) or None, whether the user
+        was inserted - False if it already existed).
+        """
+        referrer_id = None
+        if referral_code:
+            referrer = conn.execute("SELECT user_id FROM users WHERE referral_code = ?", (referral_code,)).fetchone()
+            if referrer and referrer[0] != user_id:
+                referrer_id = referrer[0]
+        
+        inserted = self.insert_new_user(
+            conn, user_id, username, first_name, referral_code if referrer_id else None
+        )
+        state = load_user_state(conn, user_id)
+        if not inserted or referrer_id is None:
+            return state, None, inserted
+        
+        # Unique index idx_referrals_referred - ek user sirf ek baar refer hota hai
+        added = conn.execute(
+            "INSERT INTO referrals (referrer_id, referred_id) VALUES (?, ?) ON CONFLICT(referred_id) DO NOTHING",
+            (referrer_id, user_id)
+        ).rowcount
+        if not added:
+            return state, None, inserted
+        
+        credit_sql = (
+            "UPDATE users SET referral_count = referral_count + 1, balance = balance + 15, "
+            "withdrawal_access = CASE WHEN referral_count + 1 >= 10 THEN TRUE ELSE withdrawal_access END "
+            "WHERE user_id = ?"
+        )
+        if HAS_RETURNING:
+            row = conn.execute(f"{credit_sql} RETURNING {USER_STATE_COLUMNS}", (referrer_id,)).fetchone()
+            referrer_state = UserState(*row)
+        else:
+            conn.execute(credit_sql, (referrer_id,))
+            referrer_state = load_user_state(conn, referrer_id)
+        return state, (referrer_id, referrer_state), inserted
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -102,31 +507,60 @@ class RenderInternetBot:
             user_id = update.effective_user.id
             username = update.effective_user.username
             first_name = update.effective_user.first_name
+            referral_code = context.args[0] if context.args else None
             
-            # Check referral
-            if context.args:
-                referral_code = context.args[0]
-                await self.handle_referral(user_id, referral_code)
-            
-            # Register user
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            user = cursor.fetchone()
+            # Register user (with referral credit, if any) - existing users skip the write entirely.
+            # Signup index decide karta hai: hit = purana user, miss = naya (register_user se pehle
+            # koi read nahi). Index load na hua ho to database se poochte hain
+            user = None
+            if self.signups.registered(user_id):
+                if referral_code:
+                    # Purana user kisi bhi code se dobara credit nahi hota - referrer lookup bhi nahi
+                    self.signups.reject_repeat(user_id)
+                user = await self.get_user_state(user_id)
+            elif not self.signups.loaded:
+                user = await self.get_user_state(user_id)
+                if user:
+                    self.signups.remember(user_id)
+                    if referral_code:
+                        self.signups.reject_repeat(user_id)
             
             if not user:
-                referral_code = self.generate_referral_code()
-                cursor.execute(
-                    "INSERT INTO users (user_id, username, first_name, referral_code) VALUES (?, ?, ?, ?)",
-                    (user_id, username, first_name, referral_code)
-                )
-                self.conn.commit()
-                print(f"✅ New user registered: {user_id}")
+                # Referrer ka lock bhi lo - same referrer ke credits ek-ek karke lagte hain.
+                # Apna hi code ho to nahi - is user ka lock PerUserUpdateProcessor pehle se pakde hai
+                referrer = None
+                if referral_code:
+                    referrer = await self.db.fetchone("SELECT user_id FROM users WHERE referral_code = ?", (referral_code,))
+                referrer_id = referrer[0] if referrer and referrer[0] != user_id else None
+                
+                async with self.user_locks.hold(referrer_id):
+                    user, credit, inserted = await self.db.transaction(
+                        lambda conn: self.register_user(conn, user_id, username, first_name, referral_code)
+                    )
+                    self.cache_user_state(user_id, user)
+                    if inserted:
+                        self.signups.add(user_id, referred=credit is not None)
+                    else:
+                        # Index peeche tha (dusre process ne banaya) - ab yaad rakho
+                        self.signups.remember(user_id)
+                    if credit and self.owns(credit[0]):
+                        self.cache_user_state(credit[0], credit[1])
+                if inserted:
+                    print(f"✅ New user registered: {user_id}")
+                
+                if credit:
+                    referrer_id, referrer_state = credit
+                    print(f"✅ Referral added: {referrer_id} -> {user_id}")
+                    if self.owns(referrer_id):
+                        self.notifier.notify_referral(referrer_id, referrer_state)
+                    else:
+                        self.shards.send_referral(referrer_id, referrer_state)
             
             # Check channel join status
-            cursor.execute("SELECT joined_channel FROM users WHERE user_id = ?", (user_id,))
-            user_data = cursor.fetchone()
-            
-            if not user_data or not user_data[0]:
+            if user and user.joined_channel and self.membership is not None:
+                # Cached status se jawab - pata na ho to background mein check (tap par koi API call nahi)
+                self.membership.touch(user_id)
+            if not user or not user.joined_channel:
                 await self.show_channel_join_message(update, context)
             else:
                 await self.show_main_menu(update, context, user_id)
@@ -135,521 +569,95 @@ class RenderInternetBot:
             print(f"Start command error: {e}")
             await update.message.reply_text("❌ Error occurred. Please try again.")
     
-    async def handle_referral(self, referred_user_id: int, referral_code: str):
-        """Handle referral registration"""
-        try:
-            cursor = self.conn.cursor()
-            
-            # Find referrer
-            cursor.execute("SELECT user_id FROM users WHERE referral_code = ?", (referral_code,))
-            referrer = cursor.fetchone()
-            
-            if referrer and referrer[0] != referred_user_id:
-                referrer_id = referrer[0]
-                
-                # Check if already referred
-                cursor.execute(
-                    "SELECT * FROM referrals WHERE referrer_id = ? AND referred_id = ?", 
-                    (referrer_id, referred_user_id)
-                )
-                if not cursor.fetchone():
-                    # Add referral
-                    cursor.execute(
-                        "INSERT INTO referrals (referrer_id, referred_id) VALUES (?, ?)",
-                        (referrer_id, referred_user_id)
-                    )
-                    
-                    # Update referral count and balance
-                    cursor.execute(
-                        "UPDATE users SET referral_count = referral_count + 1, balance = balance + 15 WHERE user_id = ?",
-                        (referrer_id,)
-                    )
-                    
-                    # Check if reached 10 referrals for withdrawal access
-                    cursor.execute("SELECT referral_count FROM users WHERE user_id = ?", (referrer_id,))
-                    ref_count = cursor.fetchone()[0]
-                    
-                    if ref_count >= 10:
-                        cursor.execute(
-                            "UPDATE users SET withdrawal_access = TRUE WHERE user_id = ?",
-                            (referrer_id,)
-                        )
-                    
-                    # Update referred_by for new user
-                    cursor.execute(
-                        "UPDATE users SET referred_by = ? WHERE user_id = ?",
-                        (referral_code, referred_user_id)
-                    )
-                    
-                    self.conn.commit()
-                    
-                    # Notify referrer
-                    try:
-                        cursor.execute("SELECT referral_count, balance FROM users WHERE user_id = ?", (referrer_id,))
-                        ref_data = cursor.fetchone()
-                        message = f"🎉 New Referral!\n\nYou got ₹15 for new referral!\nTotal Referrals: {ref_data[0]}\nBalance: ₹{ref_data[1]}"
-                        
-                        if ref_data[0] >= 10:
-                            message += "\n\n🎊 Congratulations! You now have withdrawal access!"
-                        
-                        await self.application.bot.send_message(
-                            chat_id=referrer_id,
-                            text=message
-                        )
-                    except:
-                        pass
-                    
-                    print(f"✅ Referral added: {referrer_id} -> {referred_user_id}")
-        
-        except Exception as e:
-            logging.error(f"Referral error: {e}")
-    
     async def show_channel_join_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show channel join requirement message"""
-        keyboard = [
-            [InlineKeyboardButton("📢 Join Channel", url=CHANNEL_LINK)],
-            [InlineKeyboardButton("✅ Verify Join", callback_data="verify_join")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        message_text = """
-🤖 **Welcome to Internet Sell App Bot!**
-
-💰 **Earn Money by Selling Internet:**
-
-📊 **Internet Selling Rates:**
-• 500MB Internet Sell = ₹100
-• 1GB Internet Sell = ₹200
-
-🎁 **How to Get Started:**
-1. Join our official channel
-2. Refer 10 friends to join
-3. Get Internet Sell App download link
-4. Start selling internet & earn money!
-
-👥 **Referral Program:**
-• ₹15 per successful referral
-• Minimum 10 referrals required for app access
-• **Withdrawal after 10 referrals only**
-• UPI withdrawal available
-
-👇 **Click below to join channel and start earning!**
-        """
-        
-        await update.message.reply_text(
-            message_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await self.screens.reply(update.message, screens.welcome_screen(self.channel_keyboard))
     
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks"""
         try:
-            query = update.callback_query
-            await query.answer()
-            user_id = query.from_user.id
-            
-            if query.data == "verify_join":
-                await self.verify_channel_join(query, context)
-            elif query.data == "main_menu":
-                await self.show_main_menu_from_query(query, context)
-            elif query.data == "get_referral":
-                await self.show_referral_info(query, context)
-            elif query.data == "check_balance":
-                await self.show_balance_from_query(query, context)
-            elif query.data == "get_app_link":
-                await self.get_app_link(query, context)
-            elif query.data == "withdraw_earnings":
-                await self.withdraw_earnings(query, context)
-                
+            # Router query ko screen edit ke saath-saath answer karta hai
+            await self.callbacks.dispatch(update.callback_query, context)
         except Exception as e:
             print(f"Button handler error: {e}")
     
+    @staticmethod
+    def _user_id(target) -> int:
+        """User id from a CallbackQuery or an Update (command handlers reuse the screens)"""
+        if isinstance(target, Update):
+            return target.effective_user.id
+        return target.from_user.id
+    
     async def verify_channel_join(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Verify if user joined channel"""
         user_id = query.from_user.id
         
         try:
-            # Update database
-            cursor = self.conn.cursor()
-            cursor.execute("UPDATE users SET joined_channel = TRUE WHERE user_id = ?", (user_id,))
-            self.conn.commit()
+            # Known member ho to cache se, warna ek getChatMember call
+            if self.membership is not None and not await self.membership.check(user_id):
+                await self.screens.edit(query, screens.not_joined_screen(self.channel_keyboard))
+                return
             
-            success_text = """
-✅ **Channel Join Verified Successfully!**
-
-🎉 **Welcome to Internet Sell App Program!**
-
-💰 **Earn Money by Selling Internet:**
-• 500MB Internet Sell = ₹100
-• 1GB Internet Sell = ₹200
-
-📊 **Next Steps:**
-1. Share your referral link with friends
-2. Get 10 referrals to unlock the app
-3. Earn ₹15 per referral
-4. **Withdrawal after 10 referrals only**
-5. UPI withdrawal available
-
-🎯 **Minimum 10 referrals required** to get:
-• Internet Sell App download link
-• Withdrawal access
-
-Use /referral to get your personal referral link!
-            """
+            # joined_channel sirf on_membership_change likhta hai - check() status badalne par use
+            # bula chuka hai, tab yeh cached state padh kar kuch nahi likhta. Fail-open (API ne jawab
+            # nahi diya) ya CHANNEL_ID na ho to yahi ek write karta hai
+            await self.on_membership_change(user_id, True)
             
-            await query.edit_message_text(
-                success_text,
-                parse_mode='Markdown'
-            )
+            await self.screens.edit(query, screens.Screen(screens.VERIFIED_TEXT, None, 'Markdown'))
             
             # Show main menu after verification
             await self.show_main_menu_from_query(query, context)
                 
         except Exception as e:
             print(f"Verify error: {e}")
-            await query.edit_message_text(
-                "✅ **Channel Join Verified!**\n\nUse /referral to get started!",
-                parse_mode='Markdown'
-            )
+            await self.screens.edit(query, screens.Screen(screens.VERIFIED_FALLBACK_TEXT, None, 'Markdown'))
     
     async def show_main_menu_from_query(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Show main menu after verification (from callback query)"""
-        user_id = query.from_user.id
-        
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT referral_count, balance, app_access, withdrawal_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        referral_count = user_data[0] if user_data else 0
-        balance = user_data[1] if user_data else 0
-        app_access = user_data[2] if user_data else False
-        withdrawal_access = user_data[3] if user_data else False
-        
-        status_emoji = "✅" if app_access else "❌"
-        withdrawal_emoji = "✅" if withdrawal_access else "❌"
-        remaining_refs = 10 - referral_count
-        
-        # Create menu buttons
-        keyboard = [
-            [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
-            [InlineKeyboardButton("💰 Check Balance", callback_data="check_balance")],
-            [InlineKeyboardButton("🎁 Get App Link", callback_data="get_app_link")],
-        ]
-        
-        # Add withdrawal button only if access available
-        if withdrawal_access:
-            keyboard.append([InlineKeyboardButton("💸 Withdraw Earnings", callback_data="withdraw_earnings")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        message_text = f"""
-🏠 **Main Menu - Internet Sell App**
-
-💰 **Earning Plan:**
-• 500MB Internet Sell = ₹100
-• 1GB Internet Sell = ₹200
-• ₹15 per referral
-
-📊 **Your Stats:**
-• Referrals: {referral_count}/10
-• Balance: ₹{balance}
-• App Access: {status_emoji}
-• Withdrawal Access: {withdrawal_emoji}
-
-🎯 **Requirements:**
-• Minimum 10 referrals for app access
-• Minimum 10 referrals for withdrawal
-• ₹15 per referral
-• UPI withdrawal available
-
-🔔 **Status:** {remaining_refs} referrals needed for full access
-        """
-        
-        await query.edit_message_text(
-            message_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        user_data = await self.get_user_state(query.from_user.id)
+        await self.screens.edit(query, screens.main_menu_screen(user_data))
     
     async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Show main menu (from command)"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT referral_count, balance, app_access, withdrawal_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        referral_count = user_data[0] if user_data else 0
-        balance = user_data[1] if user_data else 0
-        app_access = user_data[2] if user_data else False
-        withdrawal_access = user_data[3] if user_data else False
-        
-        status_emoji = "✅" if app_access else "❌"
-        withdrawal_emoji = "✅" if withdrawal_access else "❌"
-        remaining_refs = 10 - referral_count
-        
-        # Create menu buttons
-        keyboard = [
-            [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
-            [InlineKeyboardButton("💰 Check Balance", callback_data="check_balance")],
-            [InlineKeyboardButton("🎁 Get App Link", callback_data="get_app_link")],
-        ]
-        
-        # Add withdrawal button only if access available
-        if withdrawal_access:
-            keyboard.append([InlineKeyboardButton("💸 Withdraw Earnings", callback_data="withdraw_earnings")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        message_text = f"""
-🏠 **Main Menu - Internet Sell App**
-
-💰 **Earning Plan:**
-• 500MB Internet Sell = ₹100
-• 1GB Internet Sell = ₹200
-• ₹15 per referral
-
-📊 **Your Stats:**
-• Referrals: {referral_count}/10
-• Balance: ₹{balance}
-• App Access: {status_emoji}
-• Withdrawal Access: {withdrawal_emoji}
-
-🎯 **Requirements:**
-• Minimum 10 referrals for app access
-• Minimum 10 referrals for withdrawal
-• ₹15 per referral
-• UPI withdrawal available
-
-🔔 **Status:** {remaining_refs} referrals needed for full access
-        """
-        
-        await update.message.reply_text(
-            message_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        user_data = await self.get_user_state(user_id)
+        await self.screens.reply(update.message, screens.main_menu_screen(user_data))
     
     async def show_referral_info(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Show referral information"""
-        user_id = query.from_user.id
-        
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT referral_code, referral_count, withdrawal_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        referral_code = user_data[0]
-        referral_count = user_data[1]
-        withdrawal_access = user_data[2]
-        
-        bot_username = (await context.bot.get_me()).username
-        referral_link = f"https://t.me/{bot_username}?start={referral_code}"
-        
-        withdrawal_status = "✅ Available" if withdrawal_access else f"❌ Need {10 - referral_count} more referrals"
-        
-        message_text = f"""
-📤 **Your Referral System**
-
-🔗 **Your Referral Link:**
-`{referral_link}`
-
-📊 **Your Referrals:** {referral_count}/10
-💰 **Earnings:** ₹{referral_count * 15}
-💸 **Withdrawal Access:** {withdrawal_status}
-
-🎯 **Requirements:**
-• Minimum 10 referrals for app access
-• Minimum 10 referrals for withdrawal
-• ₹15 per successful referral
-• UPI withdrawal available
-
-💡 **How it works:**
-1. Share your referral link
-2. When friends join using your link, you get ₹15
-3. Complete 10 referrals to get:
-   • Internet Sell App download
-   • Withdrawal access
-4. Start selling internet: 500MB=₹100, 1GB=₹200
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")],
-            [InlineKeyboardButton("📢 Share Link", url=f"https://t.me/share/url?url={referral_link}&text=Join%20Internet%20Sell%20App%20-%20Earn%20Money%20by%20selling%20internet!%20500MB%3D%E2%82%B9100%2C%201GB%3D%E2%82%B9200%20%F0%9F%92%B0")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        user_data = await self.get_user_state(self._user_id(query))
+        if not user_data:
+            await self.screens.show(query, screens.Screen("❌ Please send /start first.", None, None))
+            return
         
-        await query.edit_message_text(
-            message_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        # Username initialize() ke getMe se cached hai - har tap par API call nahi
+        await self.screens.show(query, screens.referral_screen(user_data, context.bot.username))
     
     async def show_balance_from_query(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Show user balance from callback"""
-        user_id = query.from_user.id
-        
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT balance, referral_count, withdrawal_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        balance = user_data[0] if user_data else 0
-        referral_count = user_data[1] if user_data else 0
-        withdrawal_access = user_data[2] if user_data else False
-        
-        withdrawal_status = "✅ Available" if withdrawal_access else f"❌ Need {10 - referral_count} more referrals"
-        
-        message_text = f"""
-💰 **Your Earnings Summary**
-
-📊 **Current Balance:** ₹{balance}
-👥 **Total Referrals:** {referral_count}
-💵 **Referral Earnings:** ₹{referral_count * 15}
-🎯 **Remaining for Full Access:** {10 - referral_count} referrals
-💸 **Withdrawal Access:** {withdrawal_status}
-
-💰 **Internet Selling Rates:**
-• 500MB Internet Sell = ₹100
-• 1GB Internet Sell = ₹200
-
-💸 **Withdrawal Info:**
-• Minimum withdrawal: ₹50
-• **Withdrawal after 10 referrals only**
-• UPI withdrawal available
-• Processed within 24 hours
-        """
-        
-        keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            message_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        user_data = await self.get_user_state(self._user_id(query))
+        await self.screens.show(query, screens.balance_screen(user_data))
     
     async def get_app_link(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Provide app link if requirements met"""
-        user_id = query.from_user.id
+        user_id = self._user_id(query)
+        user_data = await self.get_user_state(user_id)
         
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT referral_count, app_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        referral_count = user_data[0] if user_data else 0
-        app_access = user_data[1] if user_data else False
+        referral_count = user_data.referral_count if user_data else 0
+        app_access = user_data.app_access if user_data else False
         
         if referral_count >= 10 or app_access:
             # Update app access
-            cursor.execute("UPDATE users SET app_access = TRUE WHERE user_id = ?", (user_id,))
-            self.conn.commit()
-            
-            app_link = "https://example.com/internet-sell-app.apk"  # Replace with actual app link
-            
-            success_text = f"""
-🎉 **Congratulations! App Access Granted!**
-
-📲 **Download Internet Sell App:**
-{app_link}
-
-💰 **Start Earning Money:**
-• 500MB Internet Sell = ₹100
-• 1GB Internet Sell = ₹200
-
-📊 **Your Referrals:** {referral_count}
-💵 **Referral Balance:** ₹{referral_count * 15}
-💸 **Withdrawal Access:** ✅ Available
-
-🚀 **Install the app and start selling internet today!**
-            """
+            if not app_access:
+                await self.update_user(user_id, "UPDATE users SET app_access = TRUE WHERE user_id = ?", (user_id,))
             
-            await query.edit_message_text(
-                success_text,
-                parse_mode='Markdown'
-            )
+            await self.screens.show(query, screens.app_granted_screen(referral_count))
         else:
-            remaining = 10 - referral_count
-            await query.edit_message_text(
-                f"❌ **App Access Not Available Yet!**\n\n"
-                f"📊 **Your Progress:** {referral_count}/10 referrals\n"
-                f"🎯 **Remaining:** {remaining} referrals needed\n\n"
-                f"💡 **Complete {remaining} more referrals to get:**\n"
-                f"• Internet Sell App download link\n"
-                f"• Withdrawal access\n\n"
-                f"💰 **Earning Potential after App Access:**\n"
-                f"• 500MB Internet Sell = ₹100\n"
-                f"• 1GB Internet Sell = ₹200",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
-                    [InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")]
-                ])
-            )
+            await self.screens.show(query, screens.app_locked_screen(referral_count))
     
     async def withdraw_earnings(self, query, context: ContextTypes.DEFAULT_TYPE):
         """Handle withdrawal requests"""
-        user_id = query.from_user.id
-        
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT balance, referral_count, withdrawal_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        balance = user_data[0] if user_data else 0
-        referral_count = user_data[1] if user_data else 0
-        withdrawal_access = user_data[2] if user_data else False
-        
-        if not withdrawal_access:
-            remaining = 10 - referral_count
-            await query.edit_message_text(
-                f"❌ **Withdrawal Access Not Available!**\n\n"
-                f"📊 **Your Referrals:** {referral_count}/10\n"
-                f"🎯 **Remaining:** {remaining} referrals needed\n\n"
-                f"💡 **Complete {remaining} more referrals to unlock withdrawal access!**\n\n"
-                f"💰 **Current Balance:** ₹{balance}\n"
-                f"💵 **You'll earn:** ₹{remaining * 15} more from referrals",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
-                    [InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")]
-                ])
-            )
-            return
-        
-        if balance >= 50:
-            message_text = f"""
-💸 **Withdrawal Request**
-
-💰 **Available Balance:** ₹{balance}
-👥 **Total Referrals:** {referral_count}/10 ✅
-💸 **Withdrawal Access:** ✅ Available
-
-📱 **Withdrawal Method:** UPI
-
-📝 **Process:**
-1. Minimum withdrawal: ₹50
-2. Processed within 24 hours
-3. UPI ID required
-
-📨 Please send your UPI ID to process withdrawal.
-
-Send your UPI ID in this format:
-`/withdraw your_upi_id@okbank`
-            """
-            
-            await query.edit_message_text(
-                message_text,
-                parse_mode='Markdown'
-            )
-        else:
-            await query.edit_message_text(
-                f"❌ **Insufficient Balance!**\n\n"
-                f"💰 **Current Balance:** ₹{balance}\n"
-                f"🎯 **Minimum Required:** ₹50\n\n"
-                f"💡 **Complete more referrals to increase your balance!**\n"
-                f"• ₹15 per referral\n"
-                f"• Withdrawal access: ✅ Available\n"
-                f"• Then earn: 500MB=₹100, 1GB=₹200",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
-                    [InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")]
-                ])
-            )
+        user_data = await self.get_user_state(self._user_id(query))
+        await self.screens.show(query, screens.withdraw_screen(user_data))
     
     # Command handlers
     async def referral_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -674,14 +682,28 @@ Send your UPI ID in this format:
         else:
             await self.withdraw_earnings(update, context)
     
+    def record_withdrawal(self, conn, user_id: int, upi_id: str):
+        """Debit the balance and append the ledger row in one transaction (runs on the DB thread)
+
+        Re-checks access and balance against the database, not the cache. Returns
+        (withdrawal id or None if not allowed, amount, user's state after).
+        """
+        row = conn.execute("SELECT balance, withdrawal_access FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if not row or not row[1] or row[0] < 50:
+            return None, 0, load_user_state(conn, user_id)
+        amount = row[0]
+        conn.execute("UPDATE users SET balance = 0 WHERE user_id = ?", (user_id,))
+        withdrawal_id = conn.execute(
+            "INSERT INTO withdrawals (user_id, amount, upi_id) VALUES (?, ?, ?)", (user_id, amount, upi_id)
+        ).lastrowid
+        return withdrawal_id, amount, load_user_state(conn, user_id)
+    
     async def process_withdrawal(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, upi_id: str):
         """Process withdrawal request"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT balance, withdrawal_access FROM users WHERE user_id = ?", (user_id,))
-        user_data = cursor.fetchone()
+        user_data = await self.get_user_state(user_id)
         
-        balance = user_data[0] if user_data else 0
-        withdrawal_access = user_data[1] if user_data else False
+        balance = user_data.balance if user_data else 0
+        withdrawal_access = user_data.withdrawal_access if user_data else False
         
         if not withdrawal_access:
             await update.message.reply_text(
@@ -690,23 +712,223 @@ Send your UPI ID in this format:
             )
             return
         
-        if balance >= 50:
-            # Process withdrawal
-            cursor.execute("UPDATE users SET balance = 0 WHERE user_id = ?", (user_id,))
-            self.conn.commit()
-            
+        if balance < 50:
             await update.message.reply_text(
-                f"✅ **Withdrawal Request Submitted!**\n\n"
-                f"💰 **Amount:** ₹{balance}\n"
-                f"📱 **UPI ID:** {upi_id}\n"
-                f"⏰ **Processing:** Within 24 hours\n\n"
-                f"📞 Contact support for any queries."
+                "❌ **Insufficient balance for withdrawal!**\n"
+                "Minimum withdrawal amount is ₹50."
             )
-        else:
+            return
+        
+        if not UPI_ID_PATTERN.match(upi_id):
+            await update.message.reply_text(
+                "❌ **Invalid UPI ID!**\n"
+                "Send your UPI ID in this format:\n"
+                "/withdraw your_upi_id@okbank"
+            )
+            return
+        
+        # Process withdrawal - debit + ledger row ek hi commit mein
+        withdrawal_id, amount, user_data = await self.db.transaction(
+            lambda conn: self.record_withdrawal(conn, user_id, upi_id)
+        )
+        self.cache_user_state(user_id, user_data)
+        if withdrawal_id is None:
             await update.message.reply_text(
                 "❌ **Insufficient balance for withdrawal!**\n"
                 "Minimum withdrawal amount is ₹50."
             )
+            return
+        
+        print(f"✅ Withdrawal #{withdrawal_id}: {user_id} ₹{amount}")
+        await update.message.reply_text(
+            f"✅ **Withdrawal Request Submitted!**\n\n"
+            f"🧾 **Request ID:** #{withdrawal_id}\n"
+            f"💰 **Amount:** ₹{amount}\n"
+            f"📱 **UPI ID:** {upi_id}\n"
+            f"⏰ **Processing:** Within 24 hours\n\n"
+            f"📞 Contact support for any queries."
+        )
+    
+    # Admin commands
+    @staticmethod
+    def is_admin(user_id: int) -> bool:
+        return user_id in ADMIN_IDS
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /stats command (admins only) - aggregate tables, no scans"""
+        if not self.is_admin(update.effective_user.id):
+            return
+        await self.screens.reply(update.message, screens.stats_screen(await self.db.read(load_stats)))
+    
+    async def top_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /top command (admins only) - first leaderboard page"""
+        if not self.is_admin(update.effective_user.id):
+            return
+        entries = await self.db.read(lambda conn: top_referrers(conn, TOP_PAGE_SIZE))
+        await self.screens.reply(update.message, screens.top_screen(entries, 1, TOP_PAGE_SIZE))
+    
+    async def show_top_page(self, query, context: ContextTypes.DEFAULT_TYPE, rank, referral_count, user_id):
+        """Next leaderboard page - button carries the previous page's last row"""
+        if not self.is_admin(query.from_user.id):
+            return
+        try:
+            rank, after = int(rank), (int(referral_count), int(user_id))
+        except ValueError:
+            return
+        entries = await self.db.read(lambda conn: top_referrers(conn, TOP_PAGE_SIZE, after))
+        await self.screens.edit(query, screens.top_screen(entries, rank, TOP_PAGE_SIZE))
+    
+    async def graph_target(self, update: Update, context: ContextTypes.DEFAULT_TYPE, command: str):
+        """User id from /downline or /upline args (id or referral code); replies and returns None if invalid"""
+        if not context.args:
+            await update.message.reply_text(f"Usage: /{command} <user id or referral code>")
+            return None
+        ref = context.args[0]
+        user_id = await self.db.read(lambda conn: resolve_user(conn, ref))
+        if user_id is None:
+            await update.message.reply_text(f"❌ No user with id or referral code {ref}")
+        return user_id
+    
+    async def downline_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /downline <user> (admins only) - downline size per level from referral_downline"""
+        if not self.is_admin(update.effective_user.id):
+            return
+        user_id = await self.graph_target(update, context, "downline")
+        if user_id is None:
+            return
+        result = await self.db.read(lambda conn: downline(conn, user_id))
+        await self.screens.reply(update.message, screens.downline_screen(result))
+    
+    async def upline_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /upline <user> (admins only) - referrer chain from referral_closure"""
+        if not self.is_admin(update.effective_user.id):
+            return
+        user_id = await self.graph_target(update, context, "upline")
+        if user_id is None:
+            return
+        entries = await self.db.read(lambda conn: upline(conn, user_id))
+        await self.screens.reply(update.message, screens.upline_screen(user_id, entries))
+    
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /export [pending|paid|withdrawals|users|referrals] (admins only) - CSV document"""
+        if not self.is_admin(update.effective_user.id):
+            return
+        what = context.args[0].lower() if context.args else "pending"
+        if what in WITHDRAWAL_STATUSES:
+            kind, status = "withdrawals", what
+        elif what in ("withdrawals", "users", "referrals"):
+            kind, status = what, None
+        else:
+            await update.message.reply_text("Usage: /export [pending|paid|withdrawals|users|referrals]")
+            return
+        
+        # Chunks mein temp file par likho (read pool par), phir document bhejo.
+        # Telegram bots 50 MB tak bhej sakte hain - usse badi exports ke liye export.py CLI
+        fd, path = tempfile.mkstemp(prefix=f"export_{what}_", suffix=".csv")
+        os.close(fd)
+        try:
+            def run(conn):
+                with open(path, "w", newline="", encoding="utf-8") as out:
+                    return write_csv(conn, kind, out, status)
+            
+            count = await self.db.read(run)
+            with open(path, "rb") as document:
+                await update.message.reply_document(document, filename=f"{what}.csv", caption=f"📄 {count} rows")
+        finally:
+            os.remove(path)
+    
+    def mark_withdrawals_paid(self, conn, withdrawal_ids):
+        """Mark pending withdrawals paid (runs on the DB thread); returns [(id, user_id, amount)]"""
+        paid = []
+        for withdrawal_id in withdrawal_ids:
+            row = conn.execute(
+                "SELECT user_id, amount FROM withdrawals WHERE id = ? AND status = 'pending'", (withdrawal_id,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE withdrawals SET status = 'paid', processed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (withdrawal_id,)
+                )
+                paid.append((withdrawal_id, row[0], row[1]))
+        return paid
+    
+    async def markpaid_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /markpaid <id> [<id> ...] (admins only) - record payouts and tell the users"""
+        if not self.is_admin(update.effective_user.id):
+            return
+        try:
+            withdrawal_ids = [int(arg.lstrip('#')) for arg in context.args]
+        except ValueError:
+            withdrawal_ids = []
+        if not withdrawal_ids:
+            await update.message.reply_text("Usage: /markpaid <withdrawal id> [<withdrawal id> ...]")
+            return
+        
+        paid = await self.db.transaction(lambda conn: self.mark_withdrawals_paid(conn, withdrawal_ids))
+        for withdrawal_id, user_id, amount in paid:
+            self.notifier.send_message(user_id, f"✅ Your withdrawal #{withdrawal_id} of ₹{amount} has been paid to your UPI ID.")
+        skipped = len(withdrawal_ids) - len(paid)
+        await update.message.reply_text(
+            f"✅ Marked {len(paid)} withdrawal(s) paid" + (f", {skipped} not pending or not found." if skipped else ".")
+        )
+
+def run_sharded():
+    """Supervisor: migrate once, then run SHARD_COUNT webhook workers behind one dispatcher"""
+    db = Database(DATABASE_PATH, storage_mode=DB_STORAGE_MODE, read_pool_size=0)
+    db.start()
+    try:
+        for version, description in db.run_sync(migrations.migrate, write=False):
+            print(f"✅ Migration {version} applied: {description}")
+        journal_mode = db.run_sync(lambda conn: conn.execute("PRAGMA journal_mode").fetchone()[0], write=False)
+    finally:
+        db.close()
+    if journal_mode != 'wal':
+        print(f"⚠️ Journal mode is {journal_mode} - workers will block each other; use DB_STORAGE_MODE=wal")
+
+    def worker_env(index: int, shard_secret: str) -> dict:
+        env = dict(os.environ)
+        env.update(
+            BOT_MODE='webhook',
+            SHARD_INDEX=str(index),
+            SHARD_COUNT=str(SHARD_COUNT),
+            SHARD_SECRET=shard_secret,
+            SHARD_BASE_PORT=str(SHARD_BASE_PORT),
+            WEBHOOK_LISTEN='127.0.0.1',
+            WEBHOOK_PORT=str(SHARD_BASE_PORT + index),
+            WEBHOOK_URL='',
+            WEBHOOK_SECRET='',
+            # Telegram ki global limit sab workers mein baant do
+            NOTIFY_GLOBAL_RATE=str(NOTIFY_GLOBAL_RATE / SHARD_COUNT),
+            METRICS_PORT=str(METRICS_PORT + index if METRICS_PORT else 0),
+        )
+        return env
+
+    async def set_webhook():
+        if not WEBHOOK_URL:
+            return
+        bot = Bot(BOT_TOKEN, base_url=TELEGRAM_BASE_URL or 'https://api.telegram.org/bot')
+        async with bot:
+            await bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        print(f"✅ Webhook set: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+    print(f"✅ Starting {SHARD_COUNT} shard workers on ports {SHARD_BASE_PORT}-{SHARD_BASE_PORT + SHARD_COUNT - 1}...")
+    asyncio.run(run_cluster(
+        [sys.executable, os.path.abspath(__file__)],
+        SHARD_COUNT,
+        SHARD_BASE_PORT,
+        worker_env,
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        on_ready=set_webhook,
+    ))
 
 # Main execution
 if __name__ == '__main__':
@@ -714,8 +936,28 @@ if __name__ == '__main__':
     print(f"📝 Bot Token: {BOT_TOKEN[:10]}...")
     
     try:
-        bot = RenderInternetBot(BOT_TOKEN)
-        print("✅ Bot setup complete. Starting polling...")
-        bot.application.run_polling()
+        if BOT_MODE == 'sharded':
+            run_sharded()
+        elif BOT_MODE == 'webhook':
+            bot = RenderInternetBot(BOT_TOKEN)
+            print("✅ Bot setup complete. Starting webhook server...")
+            routes = None
+            if bot.shards is not None:
+                routes = bot.shards.routes(bot.application, bot.on_remote_referral)
+            asyncio.run(serve_webhook(
+                bot.application,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                webhook_url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                routes=routes,
+            ))
+        else:
+            bot = RenderInternetBot(BOT_TOKEN)
+            print("✅ Bot setup complete. Starting polling...")
+            # chat_member updates Telegram tabhi bhejta hai jab allowed_updates mein maange jaayein
+            bot.application.run_polling(allowed_updates=Update.ALL_TYPES)
     except Exception as e:
         print(f"❌ Failed to start bot: {e}")
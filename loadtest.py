@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test
+Asli bot (internet_bot.py, unmodified run_polling) ek subprocess mein fake_bot_api ke against
+chalta hai. Recorded ya generated trace ke updates getUpdates se diye jaate hain aur
+end-to-end throughput naapa jata hai. --shards N par bot sharded mode mein chalta hai aur
+updates dispatcher ke webhook par POST hote hain.
+
+Usage:
+    python loadtest.py --users 10000 --starts 5000 --taps 5000
+    python loadtest.py --users 0 --trace trace.jsonl --speed 10
+    python loadtest.py --shards 4 --starts 5000 --taps 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import migrations
+from bench import percentile, populate
+from fake_bot_api import FakeBotAPI
+from traces import generate_trace, load_trace, to_update, write_trace
+
+TOKEN = "123456:LOADTEST"
+HERE = os.path.dirname(os.path.abspath(__file__))
+WEBHOOK_PATH = "/telegram"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(path: str, users: int, referrers: int, seed: int):
+    """Migrate and pre-populate the bot's database; returns up to `referrers` referral codes"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        migrations.migrate(conn)
+        if users:
+            populate(conn, users, seed)
+        rows = conn.execute(
+            "SELECT referral_code FROM users ORDER BY user_id LIMIT ?", (referrers,)
+        ).fetchall()
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+async def replay(api: FakeBotAPI, entries, speed: float):
+    """Push trace entries to getUpdates, honouring their timestamps / speed (0 = all at once)"""
+    started = time.monotonic()
+    for entry in entries:
+        if speed > 0:
+            delay = entry[0] / 1000 / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        api.push_update(to_update(entry, api.next_update_id))
+
+
+async def wait_for_port(port: int, bot):
+    """Wait until something accepts connections on 127.0.0.1:port"""
+    while bot.poll() is None:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    raise asyncio.TimeoutError
+
+
+async def wait_until_done(api: FakeBotAPI, bot, idle: float, timeout: float) -> bool:
+    """All updates confirmed and no Bot API call for `idle` seconds"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if bot.poll() is not None:
+            return False
+        quiet = time.monotonic() - max(api.last_call, api.first_push)
+        if api.pending() == 0 and quiet >= idle:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    db_path = os.path.join(workdir, "bot.db")
+    codes = prepare_database(db_path, args.users, args.referrers, args.seed)
+    if args.trace:
+        entries = load_trace(args.trace)
+    else:
+        entries = generate_trace(args.starts, args.taps, codes, args.users, rate=args.rate, seed=args.seed)
+        write_trace(os.path.join(workdir, "trace.jsonl"), entries)
+
+    api = FakeBotAPI(TOKEN, member_status=args.member_status, latency_ms=args.api_latency_ms)
+    await api.start()
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": TOKEN,
+        "TELEGRAM_BASE_URL": api.base_url,
+        "DATABASE_PATH": db_path,
+        "BOT_MODE": "polling",
+    })
+    if args.shards:
+        dispatcher_port = free_port()
+        env.update({
+            "BOT_MODE": "sharded",
+            "SHARD_COUNT": str(args.shards),
+            "SHARD_BASE_PORT": str(args.shard_base_port),
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "WEBHOOK_PORT": str(dispatcher_port),
+            "WEBHOOK_PATH": WEBHOOK_PATH,
+            "WEBHOOK_URL": "",
+        })
+    # Fake API par Telegram ki rate limits ka matlab nahi - notifications measurement na roke
+    env.setdefault("NOTIFY_GLOBAL_RATE", "100000")
+    env.setdefault("NOTIFY_PER_CHAT_RATE", "100000")
+    log_path = os.path.join(workdir, "bot.log")
+    with open(log_path, "w") as log:
+        bot = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "internet_bot.py")],
+            cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            if args.shards:
+                await asyncio.wait_for(
+                    wait_for_port(dispatcher_port, bot), args.startup_timeout
+                )
+                api.deliver_to(f"http://127.0.0.1:{dispatcher_port}{WEBHOOK_PATH}")
+                print(f"✅ Dispatcher up with {args.shards} shards (pid {bot.pid}), replaying {len(entries)} updates...")
+            else:
+                await asyncio.wait_for(api.polling.wait(), args.startup_timeout)
+                print(f"✅ Bot polling (pid {bot.pid}), replaying {len(entries)} updates...")
+            await replay(api, entries, args.speed)
+            done = await wait_until_done(api, bot, args.idle, args.timeout)
+        except asyncio.TimeoutError:
+            done = False
+        finally:
+            if bot.poll() is None:
+                bot.send_signal(signal.SIGINT)
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, bot.wait, 30)
+                except subprocess.TimeoutExpired:
+                    bot.kill()
+            await api.stop()
+
+    elapsed = max(api.last_call - api.first_push, 1e-9) if api.pushed else 0.0
+    latencies = sorted(api.callback_latencies)
+    results = {
+        "completed": done,
+        "updates": api.pushed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(api.pushed / elapsed, 1) if elapsed else 0.0,
+        "callback_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "callback_p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "callback_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "api_calls": dict(api.calls),
+        "bot_exit_code": bot.returncode,
+        "bot_log": log_path,
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an update trace through the real polling loop")
+    parser.add_argument("--users", type=int, default=10000, help="existing users to pre-populate")
+    parser.add_argument("--referrers", type=int, default=1000, help="deep links use codes of the first N users")
+    parser.add_argument("--trace", default="", help="replay this trace instead of generating one")
+    parser.add_argument("--starts", type=int, default=2000, help="generated /start deep links by new users")
+    parser.add_argument("--taps", type=int, default=2000, help="generated button taps by existing users")
+    parser.add_argument("--rate", type=float, default=0, help="generated updates per second (0 = one burst)")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed factor (0 = ignore timestamps)")
+    parser.add_argument("--api-latency-ms", type=float, default=0, help="simulated Bot API round trip")
+    parser.add_argument("--member-status", default="member", help="getChatMember status to report")
+    parser.add_argument("--shards", type=int, default=0, help="run BOT_MODE=sharded with N workers (0 = polling)")
+    parser.add_argument("--shard-base-port", type=int, default=9100)
+    parser.add_argument("--idle", type=float, default=1.0, help="seconds without API calls that mean done")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default="", help="write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"\n📊 Load test - {results['updates']} updates in {results['elapsed_s']}s "
+          f"({results['throughput_per_s']} updates/s){'' if results['completed'] else ' - INCOMPLETE'}")
+    print(f"   Button tap answer latency: p50 {results['callback_p50_ms']} ms, "
+          f"p95 {results['callback_p95_ms']} ms, p99 {results['callback_p99_ms']} ms")
+    print(f"   Bot API calls: {results['api_calls']}")
+    print(f"   Bot exit code: {results['bot_exit_code']}, log: {results['bot_log']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
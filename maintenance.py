@@ -0,0 +1,157 @@
+"""
+Database maintenance scheduler
+PTB ki JobQueue har check_interval par dekhti hai ki koi task due hai aur bot shaant hai ya nahi
+(handler calls/sec aur p95 latency, bot_handler_duration_seconds se). Tasks writer connection par
+transaction ke bahar chalte hain - chalte waqt writes ruki rehti hain, isliye sirf low traffic mein.
+"""
+
+import logging
+import time
+from collections import namedtuple
+
+from metrics import Histogram
+
+MaintenanceTask = namedtuple("MaintenanceTask", ["name", "interval", "run"])
+
+# Bade tables par ANALYZE poora scan na kare - approximate stats kaafi hain
+ANALYSIS_LIMIT = 1000
+INCREMENTAL_VACUUM_PAGES = 2000
+
+
+def optimize(conn) -> str:
+    """PRAGMA optimize - re-analyzes only tables whose stats look stale"""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("PRAGMA optimize").fetchall()
+    return "ok"
+
+
+def analyze(conn) -> str:
+    """Refresh planner statistics for every table and index"""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    return "ok"
+
+
+def checkpoint(conn) -> str:
+    """Checkpoint and truncate the WAL; gives up instead of waiting for active readers"""
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal':
+        return "not in WAL mode"
+    timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    conn.execute("PRAGMA busy_timeout = 0")
+    try:
+        busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {int(timeout)}")
+    return f"{checkpointed}/{log_pages} pages" + (", readers active" if busy else "")
+
+
+def incremental_vacuum(conn) -> str:
+    """Return up to INCREMENTAL_VACUUM_PAGES free pages to the filesystem"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Purani file - auto_vacuum badalne ke liye ek baar poora VACUUM chahiye (manual)
+        return "auto_vacuum is not incremental"
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if free:
+        # execute() pragma ko ek hi step chalata hai (= ek page); executescript poora chalata hai
+        conn.executescript(f"PRAGMA incremental_vacuum({min(free, INCREMENTAL_VACUUM_PAGES)})")
+    left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return f"{free - left}/{free} free pages released"
+
+
+class MaintenanceScheduler:
+    """Runs due MaintenanceTasks from the JobQueue while the bot is quiet
+
+    A check looks at handler activity since the previous check:
+    - p95 latency above max_p95 -> paused, nothing runs
+    - more than quiet_rate handler calls/sec -> deferred, unless a task is max_defer overdue
+    Due tasks then run one by one; if handler p95 climbs above max_p95 while one runs,
+    the rest wait for the next quiet check. Durations go to bot_maintenance_duration_seconds.
+    """
+
+    def __init__(self, db, metrics, check_interval: float = 60, quiet_rate: float = 2,
+                 max_p95: float = 0.25, max_defer: float = 6 * 3600):
+        self.db = db
+        self.latency = metrics.handler_latency
+        self.durations = metrics.add(Histogram(
+            "bot_maintenance_duration_seconds", "Database maintenance task duration", ("task",),
+            buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)))
+        self.check_interval = check_interval
+        self.quiet_rate = quiet_rate
+        self.max_p95 = max_p95
+        self.max_defer = max_defer
+        self.tasks = []
+        # task name -> monotonic time of its last run (start time se ginte hain)
+        self._last_run = {}
+        self._window = (time.monotonic(), {})
+        self.runs = 0
+        self.deferred = 0
+        self.paused = 0
+        self.failed = 0
+
+    def add(self, name: str, interval: float, run):
+        """Register run(conn) -> detail string, due every `interval` seconds"""
+        self.tasks.append(MaintenanceTask(name, interval, run))
+        self._last_run[name] = time.monotonic()
+
+    def start(self, job_queue) -> bool:
+        """Schedule the periodic check; False if there is no JobQueue (APScheduler missing)"""
+        if job_queue is None or not self.tasks or self.check_interval <= 0:
+            return False
+        job_queue.run_repeating(self.check, interval=self.check_interval, first=self.check_interval,
+                                name="db-maintenance")
+        return True
+
+    def _activity(self):
+        """(handler calls/sec, p95 seconds) since the previous call"""
+        now = time.monotonic()
+        started, previous = self._window
+        current = self.latency.snapshot()
+        window = None
+        for values, counts in current.items():
+            before = previous.get(values)
+            if before is not None:
+                counts = [count - old for count, old in zip(counts, before)]
+            window = counts if window is None else [a + b for a, b in zip(window, counts)]
+        self._window = (now, current)
+        if window is None:
+            return 0.0, 0.0
+        return sum(window) / max(now - started, 1e-9), self.latency.quantile(0.95, counts=window)
+
+    async def check(self, context=None):
+        now = time.monotonic()
+        due = [task for task in self.tasks if now - self._last_run[task.name] >= task.interval]
+        rate, p95 = self._activity()
+        if not due:
+            return
+        if p95 > self.max_p95:
+            self.paused += 1
+            logging.info(f"Maintenance paused: handler p95 {p95 * 1000:g}ms")
+            return
+        overdue = any(now - self._last_run[task.name] >= task.interval + self.max_defer for task in due)
+        if rate > self.quiet_rate and not overdue:
+            self.deferred += 1
+            return
+        for task in due:
+            await self.run(task)
+            _, p95 = self._activity()
+            if p95 > self.max_p95:
+                self.paused += 1
+                logging.info(f"Maintenance paused after {task.name}: handler p95 {p95 * 1000:g}ms")
+                break
+
+    async def run(self, task: MaintenanceTask):
+        started = time.perf_counter()
+        try:
+            detail = await self.db.maintain(task.run)
+        except Exception as e:
+            self.failed += 1
+            detail = f"failed: {e}"
+            logging.error(f"Maintenance task {task.name} failed: {e}")
+        elapsed = time.perf_counter() - started
+        self._last_run[task.name] = time.monotonic()
+        self.durations.observe(elapsed, task.name)
+        self.runs += 1
+        print(f"🧹 Maintenance {task.name}: {detail} ({elapsed * 1000:.0f}ms)")
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "deferred": self.deferred, "paused": self.paused, "failed": self.failed}
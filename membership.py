@@ -0,0 +1,222 @@
+"""
+Channel membership verifier
+get_chat_member ka result per user TTL ke saath cache hota hai. Channel ke chat_member updates
+(bot channel admin ho to Telegram bhejta hai) cache ko turant badalte hain - polling nahi. Purani
+entries background mein, rate limit ke andar, dobara check hoti hain; Verify tap par sirf tab API
+call hoti hai jab user cache mein member nahi hai.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from telegram.error import BadRequest, TelegramError
+
+from ratelimit import TokenBucket
+
+MEMBER_STATUSES = frozenset({"creator", "owner", "administrator", "member"})
+
+
+def parse_chat_id(value: str):
+    """'-100123' -> int, '@channel' / 'channel' -> '@channel', '' -> None"""
+    value = value.strip()
+    if not value:
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return value if value.startswith('@') else f'@{value}'
+
+
+def is_member_status(chat_member) -> bool:
+    status = str(chat_member.status)
+    if status in MEMBER_STATUSES:
+        return True
+    # Restricted user channel mein ho bhi sakta hai, nahi bhi
+    return status == "restricted" and bool(getattr(chat_member, "is_member", False))
+
+
+class ChannelMembership:
+    """Per-user channel membership with a TTL cache, push updates and background re-checks
+
+    check() answers from the cache when the user is a known member; a stale member is
+    answered from the cache too and queued for a background re-check. Unknown users and
+    cached non-members (they may have just joined) get a live get_chat_member call;
+    concurrent calls for one user share a request. If the API can't answer (bot not in
+    the channel, network), check() fails open - the old unverified behaviour.
+
+    on_change(user_id, is_member) is awaited whenever a check or a chat_member update
+    finds a different status than the cache had (or the user was unknown).
+    """
+
+    def __init__(self, bot, chat_id, on_change, ttl: float = 3600, recheck_rate: float = 5,
+                 max_size: int = 100000):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.on_change = on_change
+        self.ttl = ttl
+        self.max_size = max_size
+        self.bucket = TokenBucket(recheck_rate, max(recheck_rate, 1))
+        # user_id -> (is_member, checked_at), purana check pehle
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._queued = set()
+        self.queue = None
+        self._task = None
+        self.hits = 0
+        self.live_checks = 0
+        self.rechecks = 0
+        self.pushed = 0
+        self.errors = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def matches(self, chat) -> bool:
+        """Is this chat the configured channel"""
+        if isinstance(self.chat_id, int):
+            return chat.id == self.chat_id
+        return chat.username is not None and f'@{chat.username}'.lower() == self.chat_id.lower()
+
+    def cached(self, user_id: int):
+        """(is_member, fresh) from the cache, or None if unknown"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[1] < self.ttl
+
+    async def check(self, user_id: int) -> bool:
+        cached = self.cached(user_id)
+        if cached is not None and cached[0]:
+            self.hits += 1
+            if not cached[1]:
+                self.refresh(user_id)
+            return True
+        return await self._lookup(user_id)
+
+    def refresh(self, user_id: int):
+        """Queue a background re-check (deduplicated) - never blocks"""
+        if self.queue is None or user_id in self._queued:
+            return
+        self._queued.add(user_id)
+        self.queue.put_nowait(user_id)
+
+    def touch(self, user_id: int):
+        """User is active - re-check in the background if we don't know a fresh status"""
+        cached = self.cached(user_id)
+        if cached is None or not cached[1]:
+            self.refresh(user_id)
+
+    async def _lookup(self, user_id: int) -> bool:
+        pending = self._inflight.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            result = await self._fetch(user_id)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Koi aur intezaar na kar raha ho to "exception never retrieved" warning na aaye
+            future.exception()
+            raise
+        finally:
+            del self._inflight[user_id]
+
+    async def _fetch(self, user_id: int) -> bool:
+        self.live_checks += 1
+        try:
+            chat_member = await self.bot.get_chat_member(self.chat_id, user_id)
+        except BadRequest as e:
+            text = str(e).lower()
+            if "user not found" in text or "participant" in text:
+                await self.observe(user_id, False)
+                return False
+            self.errors += 1
+            logging.warning(f"Membership check for {user_id} failed: {e}")
+            return True
+        except TelegramError as e:
+            self.errors += 1
+            logging.warning(f"Membership check for {user_id} failed: {e}")
+            return True
+        is_member = is_member_status(chat_member)
+        await self.observe(user_id, is_member)
+        return is_member
+
+    async def observe(self, user_id: int, is_member: bool):
+        """Store a fresh status and report a change"""
+        previous = self._entries.pop(user_id, None)
+        self._entries[user_id] = (is_member, time.monotonic())
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        if previous is None or previous[0] != is_member:
+            try:
+                await self.on_change(user_id, is_member)
+            except Exception as e:
+                logging.error(f"Membership change handler failed for {user_id}: {e}")
+
+    async def handle_update(self, update, context):
+        """ChatMemberHandler callback - join/leave/kick in the channel"""
+        event = update.chat_member
+        if event is None or not self.matches(event.chat):
+            return
+        self.pushed += 1
+        await self.observe(event.new_chat_member.user.id, is_member_status(event.new_chat_member))
+
+    def _queue_stale(self):
+        """Queue stale members, oldest check first, up to what the bucket allows soon"""
+        now = time.monotonic()
+        budget = max(int(self.bucket.rate * 10), 1)
+        for user_id, (is_member, checked_at) in self._entries.items():
+            if now - checked_at < self.ttl or budget <= 0:
+                break
+            # Stale non-member ko pakadne ki zarurat nahi - Verify tap par live check hota hai
+            if is_member:
+                self.refresh(user_id)
+                budget -= 1
+
+    async def _worker(self):
+        sweep_every = max(self.ttl / 4, 1)
+        next_sweep = time.monotonic() + sweep_every
+        while True:
+            try:
+                user_id = await asyncio.wait_for(self.queue.get(), timeout=max(next_sweep - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                self._queue_stale()
+                next_sweep = time.monotonic() + sweep_every
+                continue
+            self._queued.discard(user_id)
+            cached = self.cached(user_id)
+            if cached is not None and cached[1]:
+                continue
+            wait = self.bucket.take()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self.bucket.take()
+            self.rechecks += 1
+            try:
+                await self._lookup(user_id)
+            except Exception as e:
+                logging.error(f"Membership re-check for {user_id} failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "live_checks": self.live_checks,
+            "rechecks": self.rechecks,
+            "pushed": self.pushed,
+            "errors": self.errors,
+        }
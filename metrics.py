@@ -0,0 +1,310 @@
+"""
+Hot-path metrics
+Handlers, SQL statements aur Telegram API calls ki counts/latency - Prometheus text format
+mein local HTTP endpoint par, aur optional periodic log summary
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+from telegram.request import BaseRequest
+
+from http_server import HTTPServer, text_response
+
+# Seconds - 1ms se 10s tak
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in sorted(self._values.items()):
+            yield f"{self.name}{_label_text(self.labels, values)} {total}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def snapshot(self):
+        """label values -> copy of per-bucket counts (for windowed comparisons)"""
+        with self._lock:
+            return {values: list(series[:-1]) for values, series in self._series.items()}
+
+    def quantile(self, q: float, *label_values, counts=None) -> float:
+        """Upper bucket bound containing the q-quantile (approximate, inf above the last bucket)"""
+        if counts is None:
+            series = self._series.get(label_values)
+            counts = series[:-1] if series else None
+        total = sum(counts) if counts else 0
+        if not total:
+            return 0.0
+        target = q * total
+        running = 0
+        for index, bound in enumerate(self.buckets):
+            running += counts[index]
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, series in sorted(self._series.items()):
+            running = 0
+            for index, bound in enumerate(self.buckets):
+                running += series[index]
+                yield f"{self.name}_bucket{_label_text(self.labels + ('le',), values + (bound,))} {running}"
+            running += series[len(self.buckets)]
+            yield f"{self.name}_bucket{_label_text(self.labels + ('le',), values + ('+Inf',))} {running}"
+            yield f"{self.name}_sum{_label_text(self.labels, values)} {series[-1]}"
+            yield f"{self.name}_count{_label_text(self.labels, values)} {running}"
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name: str, help_text: str, callback, metric_type: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        yield f"{self.name} {self.callback()}"
+
+
+class PhaseTimer:
+    """Wall-clock breakdown of startup phases, measured from `started` (perf_counter)"""
+
+    def __init__(self, started: float = None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - begin))
+
+    def mark(self, name: str, since: float):
+        """Record a phase that started at `since` and ends now"""
+        self.phases.append((name, time.perf_counter() - since))
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started
+        parts = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        return f"{total * 1000:.0f}ms total - {parts}"
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """Short, low-cardinality label for a SQL statement, e.g. 'UPDATE users'"""
+    text = " ".join(sql.split())
+    match = re.match(r"(?i)(select|insert|update|delete|replace|pragma|create|begin|commit|rollback|savepoint|release|with|analyze)\b", text)
+    verb = match.group(1).upper() if match else text.split(' ', 1)[0].upper()[:16]
+    if verb in ('SELECT', 'DELETE'):
+        table = re.search(r"(?i)\bfrom\s+(\w+)", text)
+    elif verb == 'INSERT' or verb == 'REPLACE':
+        table = re.search(r"(?i)\binto\s+(\w+)", text)
+    elif verb == 'UPDATE':
+        table = re.search(r"(?i)^update\s+(\w+)", text)
+    elif verb == 'PRAGMA':
+        table = re.search(r"(?i)^pragma\s+(\w+)", text)
+    else:
+        table = None
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+class Metrics:
+    """The bot's metric registry"""
+
+    def __init__(self):
+        self._metrics = []
+        self.handler_latency = self.add(Histogram(
+            "bot_handler_duration_seconds", "Update handler latency", ("handler",)))
+        self.handler_errors = self.add(Counter(
+            "bot_handler_errors_total", "Exceptions escaping update handlers", ("handler",)))
+        self.sql_latency = self.add(Histogram(
+            "bot_sql_duration_seconds", "SQL statement latency", ("statement",)))
+        self.sql_errors = self.add(Counter(
+            "bot_sql_errors_total", "Failed SQL statements", ("statement",)))
+        self.sql_rows = self.add(Counter(
+            "bot_sql_rows_total", "Rows changed by SQL statements", ("statement",)))
+        self.api_latency = self.add(Histogram(
+            "bot_telegram_api_duration_seconds", "Telegram Bot API call latency", ("method",)))
+        self.api_errors = self.add(Counter(
+            "bot_telegram_api_errors_total", "Failed Telegram Bot API calls", ("method",)))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, callback, metric_type: str = "gauge"):
+        return self.add(Gauge(name, help_text, callback, metric_type))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.error(f"Metric {metric.name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+    def instrument_handler(self, name: str, callback):
+        """Wrap an async handler callback with latency and error accounting"""
+        @wraps(callback)
+        async def instrumented(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception:
+                self.handler_errors.inc(1, name)
+                raise
+            finally:
+                self.handler_latency.observe(time.perf_counter() - started, name)
+        return instrumented
+
+    def observe_sql(self, sql: str, seconds: float, rows: int, failed: bool):
+        """Database observer hook (called from DB threads)"""
+        label = statement_label(sql)
+        self.sql_latency.observe(seconds, label)
+        if failed:
+            self.sql_errors.inc(1, label)
+        elif rows > 0:
+            self.sql_rows.inc(rows, label)
+
+    def summary(self) -> str:
+        """One-line-per-handler summary for the periodic log"""
+        parts = []
+        for values in sorted(self.handler_latency.snapshot()):
+            count = self.handler_latency.count(*values)
+            p50 = self.handler_latency.quantile(0.5, *values) * 1000
+            p95 = self.handler_latency.quantile(0.95, *values) * 1000
+            parts.append(f"{values[0]}: n={count} p50<={p50:g}ms p95<={p95:g}ms")
+        return "; ".join(parts) or "no handler calls yet"
+
+
+class InstrumentedRequest(BaseRequest):
+    """BaseRequest wrapper timing every Bot API call by method name"""
+
+    def __init__(self, inner: BaseRequest, metrics: Metrics):
+        self.inner = inner
+        self.metrics = metrics
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await self.inner.do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+        except Exception:
+            self.metrics.api_errors.inc(1, api_method)
+            raise
+        finally:
+            self.metrics.api_latency.observe(time.perf_counter() - started, api_method)
+        if code >= 400:
+            self.metrics.api_errors.inc(1, api_method)
+        return code, payload
+
+
+class MetricsExporter:
+    """Serves GET /metrics and optionally logs a summary every log_interval seconds"""
+
+    def __init__(self, metrics: Metrics, listen: str = "127.0.0.1", port: int = 0, log_interval: float = 0):
+        self.metrics = metrics
+        self.server = HTTPServer(listen, port, max_connections=8) if port else None
+        self.log_interval = log_interval
+        self._log_task = None
+        if self.server is not None:
+            self.server.route('GET', '/metrics', self.scrape)
+
+    async def scrape(self, request):
+        return text_response(200, self.metrics.render(), "text/plain; version=0.0.4; charset=utf-8")
+
+    async def start(self):
+        if self.server is not None:
+            await self.server.start()
+            print(f"✅ Metrics endpoint: http://{self.server.host}:{self.server.port}/metrics")
+        if self.log_interval > 0:
+            self._log_task = asyncio.create_task(self._log_loop())
+
+    async def stop(self):
+        if self._log_task is not None:
+            self._log_task.cancel()
+            self._log_task = None
+        if self.server is not None:
+            await self.server.stop()
+
+    async def _log_loop(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            logging.info(f"📊 Handlers - {self.metrics.summary()}")
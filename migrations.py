@@ -0,0 +1,333 @@
+"""
+Versioned schema migrations
+Schema version PRAGMA user_version mein rehta hai - har migration ek baar, order mein chalti hai
+"""
+
+import secrets
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """Register a migration function fn(conn) for the given schema version"""
+    def register(fn):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(conn):
+    """Apply pending migrations, each in its own transaction; returns the applied ones
+
+    Needs a connection in autocommit mode (isolation_level=None), i.e. the DB thread.
+    """
+    applied = []
+    version = current_version(conn)
+    for target, description, fn in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        applied.append((target, description))
+        version = target
+    return applied
+
+
+@migration(1, "users and referrals tables")
+def create_base_tables(conn):
+    # IF NOT EXISTS - purane databases (user_version 0) par bhi safe
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            joined_channel BOOLEAN DEFAULT FALSE,
+            referral_code TEXT UNIQUE,
+            referred_by TEXT,
+            referral_count INTEGER DEFAULT 0,
+            balance INTEGER DEFAULT 0,
+            app_access BOOLEAN DEFAULT FALSE,
+            withdrawal_access BOOLEAN DEFAULT FALSE,
+            joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referrals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            referrer_id INTEGER,
+            referred_id INTEGER,
+            referral_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+@migration(2, "referral indexes")
+def add_referral_indexes(conn):
+    # Ek user sirf ek baar refer ho sakta hai - purani duplicate rows (pehli wali rakh kar) hatao.
+    # Balances ko haath nahi lagate, sirf extra edges jaate hain.
+    conn.execute('''
+        DELETE FROM referrals
+        WHERE id NOT IN (SELECT MIN(id) FROM referrals GROUP BY referred_id)
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_referrals_referred ON referrals (referred_id)")
+    # (referrer_id, referred_id) - pair check ke saath referrer_id lookups bhi isi index se
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_referrals_pair ON referrals (referrer_id, referred_id)")
+
+
+@migration(3, "meta table for referral code allocation")
+def add_meta_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value
+        )
+    ''')
+    # Permutation key ek baar banti hai - badli to naye codes purane codes se takra sakte hain
+    conn.execute(
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('referral_code_key', ?)",
+        (secrets.token_hex(32),)
+    )
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('referral_code_seq', 0)")
+
+
+@migration(4, "aggregate stats tables and leaderboard index")
+def add_stats_tables(conn):
+    # Totals aur UTC din ke buckets - triggers usi transaction mein update karte hain jisme
+    # users/referrals badalte hain, isliye /stats ko kabhi table scan nahi karna padta
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, name)
+        ) WITHOUT ROWID
+    ''')
+
+    # Backfill - abhi tak ke data se totals, aur joined_date/referral_date se din ke buckets
+    conn.execute('''
+        INSERT OR REPLACE INTO stats_counters (name, value) VALUES
+            ('users', (SELECT COUNT(*) FROM users)),
+            ('verified_users', (SELECT COUNT(*) FROM users WHERE joined_channel)),
+            ('referrals', (SELECT COUNT(*) FROM referrals)),
+            ('outstanding_balance', (SELECT COALESCE(SUM(balance), 0) FROM users)),
+            ('withdrawals', 0),
+            ('withdrawn_amount', 0)
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO stats_daily (day, name, value)
+        SELECT date(joined_date), 'users', COUNT(*) FROM users WHERE joined_date IS NOT NULL GROUP BY 1
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO stats_daily (day, name, value)
+        SELECT date(referral_date), 'referrals', COUNT(*) FROM referrals WHERE referral_date IS NOT NULL GROUP BY 1
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_user_insert AFTER INSERT ON users BEGIN
+            UPDATE stats_counters SET value = value + CASE name
+                WHEN 'users' THEN 1
+                WHEN 'verified_users' THEN COALESCE(NEW.joined_channel, 0)
+                ELSE COALESCE(NEW.balance, 0) END
+            WHERE name IN ('users', 'verified_users', 'outstanding_balance');
+            INSERT INTO stats_daily (day, name, value) VALUES (date('now'), 'users', 1)
+                ON CONFLICT(day, name) DO UPDATE SET value = value + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_user_delete AFTER DELETE ON users BEGIN
+            UPDATE stats_counters SET value = value - CASE name
+                WHEN 'users' THEN 1
+                WHEN 'verified_users' THEN COALESCE(OLD.joined_channel, 0)
+                ELSE COALESCE(OLD.balance, 0) END
+            WHERE name IN ('users', 'verified_users', 'outstanding_balance');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_user_verified AFTER UPDATE OF joined_channel ON users
+        WHEN COALESCE(OLD.joined_channel, 0) != COALESCE(NEW.joined_channel, 0) BEGIN
+            UPDATE stats_counters SET value = value + CASE WHEN NEW.joined_channel THEN 1 ELSE -1 END
+            WHERE name = 'verified_users';
+            INSERT INTO stats_daily (day, name, value) SELECT date('now'), 'verified', 1 WHERE NEW.joined_channel
+                ON CONFLICT(day, name) DO UPDATE SET value = value + 1;
+        END
+    ''')
+    # Balance sirf referral credit se badhta hai aur withdrawal se ghatta hai
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_user_balance AFTER UPDATE OF balance ON users
+        WHEN COALESCE(OLD.balance, 0) != COALESCE(NEW.balance, 0) BEGIN
+            UPDATE stats_counters SET value = value + COALESCE(NEW.balance, 0) - COALESCE(OLD.balance, 0)
+            WHERE name = 'outstanding_balance';
+            UPDATE stats_counters SET value = value + CASE name
+                WHEN 'withdrawals' THEN 1
+                ELSE COALESCE(OLD.balance, 0) - COALESCE(NEW.balance, 0) END
+            WHERE name IN ('withdrawals', 'withdrawn_amount')
+                AND COALESCE(NEW.balance, 0) < COALESCE(OLD.balance, 0);
+            INSERT INTO stats_daily (day, name, value)
+                SELECT date('now'), 'withdrawals', 1 WHERE COALESCE(NEW.balance, 0) < COALESCE(OLD.balance, 0)
+                ON CONFLICT(day, name) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_daily (day, name, value)
+                SELECT date('now'), 'withdrawn_amount', COALESCE(OLD.balance, 0) - COALESCE(NEW.balance, 0)
+                WHERE COALESCE(NEW.balance, 0) < COALESCE(OLD.balance, 0)
+                ON CONFLICT(day, name) DO UPDATE SET value = value + excluded.value;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_referral_insert AFTER INSERT ON referrals BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'referrals';
+            INSERT INTO stats_daily (day, name, value) VALUES (date('now'), 'referrals', 1)
+                ON CONFLICT(day, name) DO UPDATE SET value = value + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_referral_delete AFTER DELETE ON referrals BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'referrals';
+        END
+    ''')
+
+    # /top - index ko ulta scan karke (referral_count DESC, user_id DESC) bina sort ke
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count)")
+
+
+@migration(5, "withdrawals ledger")
+def add_withdrawals_ledger(conn):
+    # Har withdrawal request ki row - balance debit ke saath hi likhi jati hai. Rows delete
+    # nahi hoti; payout hone par sirf status/processed_at badalta hai
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS withdrawals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            upi_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed_at TIMESTAMP
+        )
+    ''')
+    # Export keyset pagination: (status, id) pending/paid ke liye, (user_id, id) user history ke liye
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawals (status, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_withdrawals_user ON withdrawals (user_id, id)")
+
+
+# Trigger bodies mein WITH nahi chalta - edge (referrer -> referred) ke dono taraf ke sets inline:
+# referrer + uske ancestors (depth 0 = khud), aur referred + uske descendants
+_EDGE_ANCESTORS = '''
+    (SELECT ancestor_id, depth FROM referral_closure WHERE descendant_id = {edge}.referrer_id
+     UNION ALL SELECT {edge}.referrer_id, 0)
+'''
+_EDGE_DESCENDANTS = '''
+    (SELECT descendant_id, depth FROM referral_closure WHERE ancestor_id = {edge}.referred_id
+     UNION ALL SELECT {edge}.referred_id, 0)
+'''
+# Har (ancestor, descendant) pair jo is edge se hokar jaata hai
+_EDGE_PAIRS = (
+    "SELECT a.ancestor_id AS ancestor_id, d.descendant_id AS descendant_id, a.depth + 1 + d.depth AS depth "
+    "FROM " + _EDGE_ANCESTORS + " AS a, " + _EDGE_DESCENDANTS + " AS d "
+    "WHERE a.ancestor_id != d.descendant_id"
+)
+
+
+@migration(6, "referral graph closure table")
+def add_referral_closure(conn):
+    # Har ancestor -> descendant pair uski depth ke saath (depth 1 = direct referral), aur har
+    # user ki har level par downline size - /downline ek PK range lookup hai, /upline ek index lookup
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant ON referral_closure (descendant_id, depth)"
+    )
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_downline (
+            user_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            PRIMARY KEY (user_id, depth)
+        ) WITHOUT ROWID
+    ''')
+
+    # Backfill - recursive CTE ek baar; har user ka ek hi referrer hai (idx_referrals_referred),
+    # depth limit purane data mein kisi cycle se bachata hai
+    conn.execute('''
+        INSERT OR IGNORE INTO referral_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE chain (ancestor_id, descendant_id, depth) AS (
+            SELECT referrer_id, referred_id, 1 FROM referrals
+            UNION ALL
+            SELECT r.referrer_id, chain.descendant_id, chain.depth + 1
+            FROM chain JOIN referrals r ON r.referred_id = chain.ancestor_id
+            WHERE chain.depth < 1000
+        )
+        SELECT ancestor_id, descendant_id, MIN(depth) FROM chain
+        WHERE ancestor_id != descendant_id GROUP BY ancestor_id, descendant_id
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO referral_downline (user_id, depth, size)
+        SELECT ancestor_id, depth, COUNT(*) FROM referral_closure GROUP BY ancestor_id, depth
+    ''')
+
+    # Naya edge: referrer ke har ancestor ko referred ka poora subtree milta hai. Naye user ke
+    # liye yeh referrer ki depth jitni rows hain
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS referral_closure_insert AFTER INSERT ON referrals BEGIN
+            INSERT INTO referral_downline (user_id, depth, size)
+                SELECT ancestor_id, depth, COUNT(*) FROM ({_EDGE_PAIRS.format(edge='NEW')}) WHERE 1
+                GROUP BY ancestor_id, depth
+                ON CONFLICT(user_id, depth) DO UPDATE SET size = size + excluded.size;
+            INSERT OR IGNORE INTO referral_closure (ancestor_id, descendant_id, depth)
+                {_EDGE_PAIRS.format(edge='NEW')};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS referral_closure_delete AFTER DELETE ON referrals BEGIN
+            UPDATE referral_downline SET size = size - (
+                SELECT COUNT(*) FROM ({_EDGE_PAIRS.format(edge='OLD')}) AS p
+                WHERE p.ancestor_id = referral_downline.user_id AND p.depth = referral_downline.depth
+            )
+            WHERE user_id IN (SELECT ancestor_id FROM {_EDGE_ANCESTORS.format(edge='OLD')});
+            DELETE FROM referral_downline
+                WHERE size <= 0 AND user_id IN (SELECT ancestor_id FROM {_EDGE_ANCESTORS.format(edge='OLD')});
+            DELETE FROM referral_closure
+                WHERE ancestor_id IN (SELECT ancestor_id FROM {_EDGE_ANCESTORS.format(edge='OLD')})
+                AND descendant_id IN (SELECT descendant_id FROM {_EDGE_DESCENDANTS.format(edge='OLD')});
+        END
+    ''')
+
+
+@migration(7, "users write sequence")
+def add_user_write_sequence(conn):
+    # Users table ki har committed insert/update/delete par +1 - UserStore snapshot isi number ke
+    # saath likha jata hai; start par number alag ho to snapshot ke baad kisi ne users badla hai
+    conn.execute("INSERT OR IGNORE INTO stats_counters (name, value) VALUES ('user_writes', 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS user_writes_{event.lower()} AFTER {event} ON users BEGIN
+                UPDATE stats_counters SET value = value + 1 WHERE name = 'user_writes';
+            END
+        ''')
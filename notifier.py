@@ -0,0 +1,178 @@
+"""
+Background outbound notifications
+Referrer ko "New Referral" message ab /start handler ke andar nahi bheja jata - queue mein
+jata hai aur background workers Telegram limits ke andar bhejte hain
+"""
+
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from ratelimit import KeyedTokenBuckets, TokenBucket
+
+# text None = referral notification, text send time par pending credits se banta hai
+Job = namedtuple("Job", ["chat_id", "text", "attempt"])
+
+
+def referral_message(new_referrals: int, state) -> str:
+    if new_referrals == 1:
+        message = (
+            f"🎉 New Referral!\n\nYou got ₹15 for new referral!\n"
+            f"Total Referrals: {state.referral_count}\nBalance: ₹{state.balance}"
+        )
+    else:
+        message = (
+            f"🎉 {new_referrals} New Referrals!\n\nYou got ₹{new_referrals * 15} for {new_referrals} new referrals!\n"
+            f"Total Referrals: {state.referral_count}\nBalance: ₹{state.balance}"
+        )
+    if state.referral_count >= 10:
+        message += "\n\n🎊 Congratulations! You now have withdrawal access!"
+    return message
+
+
+class Notifier:
+    """In-process send queue drained by workers under global and per-chat token buckets
+
+    Referral credits for a referrer whose notification hasn't gone out yet are merged into
+    that one message. 429s pause all sending for retry_after; timeouts and network errors
+    are retried with exponential backoff; blocked users / bad requests are dropped.
+    """
+
+    def __init__(self, bot, workers: int = 4, global_rate: float = 30, per_chat_rate: float = 1,
+                 max_retries: int = 5):
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets = KeyedTokenBuckets(per_chat_rate, 1)
+        self.queue = None
+        self._pending_referrals = {}
+        self._tasks = []
+        self._delayed = set()
+        self._paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5):
+        """Try to flush queued messages for up to `timeout` seconds, then stop the workers"""
+        if not self._tasks:
+            return
+        deadline = time.monotonic() + timeout
+        while (not self.queue.empty() or self._delayed) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for handle in self._delayed:
+            handle.cancel()
+        dropped = self.queue.qsize() + len(self._delayed)
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if dropped:
+            logging.warning(f"Notifier stopped with {dropped} unsent messages")
+
+    def notify_referral(self, referrer_id: int, state):
+        """Queue (or merge into a queued) referral notification - never blocks"""
+        pending = self._pending_referrals.get(referrer_id)
+        if pending is not None:
+            pending[0] += 1
+            pending[1] = state
+            self.coalesced += 1
+            return
+        self._pending_referrals[referrer_id] = [1, state]
+        self._enqueue(Job(referrer_id, None, 0))
+
+    def send_message(self, chat_id: int, text: str):
+        """Queue a plain text message"""
+        self._enqueue(Job(chat_id, text, 0))
+
+    def _enqueue(self, job: Job):
+        if self.queue is None:
+            logging.warning(f"Notifier not started, dropping message to {job.chat_id}")
+            return
+        self.queue.put_nowait(job)
+
+    def _enqueue_later(self, job: Job, delay: float):
+        loop = asyncio.get_running_loop()
+        handle = None
+
+        def fire():
+            self._delayed.discard(handle)
+            self._enqueue(job)
+
+        handle = loop.call_later(delay, fire)
+        self._delayed.add(handle)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logging.error(f"Notifier error for {job.chat_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job: Job):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        # Per-chat limit - worker ko block mat karo, job baad mein wapas queue mein
+        wait = self.chat_buckets.take(job.chat_id)
+        if wait:
+            self._enqueue_later(job, wait)
+            return
+        wait = self.global_bucket.take()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.global_bucket.take()
+
+        text = job.text
+        if text is None:
+            pending = self._pending_referrals.pop(job.chat_id, None)
+            if pending is None:
+                return
+            text = referral_message(pending[0], pending[1])
+
+        try:
+            await self.bot.send_message(chat_id=job.chat_id, text=text)
+            self.sent += 1
+        except RetryAfter as e:
+            retry_after = float(e.retry_after)
+            self._paused_until = time.monotonic() + retry_after
+            self._retry(job, text, retry_after)
+        except (Forbidden, BadRequest) as e:
+            # User ne bot block kiya / chat nahi mili - retry ka fayda nahi
+            self.failed += 1
+            logging.info(f"Notification to {job.chat_id} dropped: {e}")
+        except (NetworkError, TelegramError) as e:
+            self._retry(job, text, min(2 ** job.attempt, 60))
+            logging.debug(f"Notification to {job.chat_id} failed, retrying: {e}")
+
+    def _retry(self, job: Job, text: str, delay: float):
+        if job.attempt >= self.max_retries:
+            self.failed += 1
+            logging.warning(f"Notification to {job.chat_id} failed after {job.attempt + 1} attempts")
+            return
+        self.retried += 1
+        self._enqueue_later(Job(job.chat_id, text, job.attempt + 1), delay)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "delayed": len(self._delayed),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+        }
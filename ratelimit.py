@@ -0,0 +1,75 @@
+"""
+Token bucket rate limiting
+Outgoing messages (Telegram limits) aur incoming taps dono ke liye same buckets
+"""
+
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float = None) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float = None) -> float:
+        """Take a token if available and return 0, else return the wait time without taking"""
+        wait = self.delay(now)
+        if wait == 0.0:
+            self.tokens -= 1
+        return wait
+
+    def is_full(self, now: float = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= self.capacity
+
+
+class KeyedTokenBuckets:
+    """One TokenBucket per key (chat, user); idle full buckets are pruned past max_keys"""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def bucket(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self.prune()
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+        return bucket
+
+    def take(self, key, now: float = None) -> float:
+        return self.bucket(key).take(now)
+
+    def delay(self, key, now: float = None) -> float:
+        return self.bucket(key).delay(now)
+
+    def prune(self):
+        """Drop buckets that are full again - they behave exactly like new ones"""
+        now = time.monotonic()
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
@@ -0,0 +1,69 @@
+"""
+Referral code allocation
+Har naye user ko ek sequence number milta hai, aur ek secret-keyed permutation use
+fixed-length code mein badalti hai - permutation bijective hai, isliye database mein
+"ye code pehle se hai kya" wala SELECT loop nahi chahiye
+"""
+
+import hashlib
+import string
+
+ALPHABET = string.ascii_uppercase + string.digits
+FEISTEL_ROUNDS = 4
+
+
+class ReferralCodeGenerator:
+    """Maps sequence numbers 0..36**length-1 to unique, non-guessable codes
+
+    A keyed Feistel network permutes the smallest even-width bit space that covers the
+    domain, and cycle-walking keeps the result inside it, so distinct sequence numbers
+    always give distinct codes.
+    """
+
+    def __init__(self, key: bytes, length: int = 7):
+        if length < 4:
+            raise ValueError("Referral code length must be at least 4")
+        self.key = key
+        self.length = length
+        self.domain = len(ALPHABET) ** length
+        self.half_bits = ((self.domain - 1).bit_length() + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, round_no: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(16, 'big'), digest_size=8, key=self.key, person=round_no.to_bytes(16, 'big')
+        ).digest()
+        return int.from_bytes(digest, 'big') & self.half_mask
+
+    def _feistel(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_no in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(round_no, right)
+        return (left << self.half_bits) | right
+
+    def code_for(self, sequence: int) -> str:
+        """Referral code for a sequence number (same input always gives the same code)"""
+        if not 0 <= sequence < self.domain:
+            raise ValueError(f"Referral code space exhausted for length {self.length}")
+        value = self._feistel(sequence)
+        while value >= self.domain:
+            value = self._feistel(value)
+        chars = []
+        for _ in range(self.length):
+            value, index = divmod(value, len(ALPHABET))
+            chars.append(ALPHABET[index])
+        return ''.join(reversed(chars))
+
+    def next_code(self, conn) -> str:
+        """Take the next sequence number from the meta table and return its code
+
+        Must run inside a write transaction on the DB thread.
+        """
+        sequence = conn.execute("SELECT value FROM meta WHERE key = 'referral_code_seq'").fetchone()[0]
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'referral_code_seq'", (int(sequence) + 1,))
+        return self.code_for(int(sequence))
+
+
+def load_key(conn) -> bytes:
+    """Secret permutation key stored by migration 3"""
+    return bytes.fromhex(conn.execute("SELECT value FROM meta WHERE key = 'referral_code_key'").fetchone()[0])
@@ -0,0 +1,42 @@
+"""
+Referral graph readers
+referral_closure / referral_downline migration 6 ke triggers har naye referral par update karte
+hain - yahan sirf indexed lookups hain, koi recursive query nahi
+"""
+
+from collections import namedtuple
+
+UPLINE_LIMIT = 20
+
+Downline = namedtuple("Downline", ["user_id", "total", "levels"])
+UplineEntry = namedtuple("UplineEntry", ["user_id", "depth", "username", "first_name"])
+
+
+def resolve_user(conn, ref: str):
+    """user_id for a numeric id or a referral code; None if no such user"""
+    row = None
+    if ref.isdigit():
+        row = conn.execute("SELECT user_id FROM users WHERE user_id = ?", (int(ref),)).fetchone()
+    if row is None:
+        # Code bhi sirf digits ho sakta hai - id na mile to code maan kar dekho
+        row = conn.execute("SELECT user_id FROM users WHERE referral_code = ?", (ref,)).fetchone()
+    return row[0] if row else None
+
+
+def downline(conn, user_id: int) -> Downline:
+    """Everyone below user_id - total plus [(depth, size)] per level, depth 1 = direct referrals"""
+    levels = conn.execute(
+        "SELECT depth, size FROM referral_downline WHERE user_id = ? ORDER BY depth", (user_id,)
+    ).fetchall()
+    return Downline(user_id, sum(size for _, size in levels), levels)
+
+
+def upline(conn, user_id: int, limit: int = UPLINE_LIMIT):
+    """Referrer chain of user_id, nearest first"""
+    rows = conn.execute(
+        "SELECT c.ancestor_id, c.depth, u.username, u.first_name FROM referral_closure c "
+        "LEFT JOIN users u ON u.user_id = c.ancestor_id "
+        "WHERE c.descendant_id = ? ORDER BY c.depth LIMIT ?",
+        (user_id, limit)
+    ).fetchall()
+    return [UplineEntry(*row) for row in rows]
@@ -0,0 +1,82 @@
+"""
+Callback query routing
+Button ka callback_data "prefix" ya "prefix:arg1:arg2" hota hai - prefix se dict lookup hota
+hai aur args handler ko positional milte hain (pagination tokens waghera)
+"""
+
+import asyncio
+import inspect
+import logging
+from collections import namedtuple
+
+from telegram.error import TelegramError
+
+SEPARATOR = ":"
+# Telegram callback_data ki limit
+MAX_CALLBACK_DATA = 64
+UNKNOWN_BUTTON_TEXT = "⚠️ This button is no longer available. Please send /start."
+
+Route = namedtuple("Route", ["handler", "min_args", "max_args", "auto_answer"])
+
+
+def callback_data(prefix: str, *args) -> str:
+    """Build callback_data for a routed button"""
+    data = SEPARATOR.join((prefix,) + tuple(str(arg) for arg in args))
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data longer than {MAX_CALLBACK_DATA} bytes: {data!r}")
+    return data
+
+
+def _arity(handler):
+    """(min, max) number of route args handler(query, context, *args) accepts (max None = any)"""
+    params = list(inspect.signature(handler).parameters.values())[2:]
+    if any(p.kind == p.VAR_POSITIONAL for p in params):
+        return sum(1 for p in params if p.kind == p.POSITIONAL_OR_KEYWORD and p.default is p.empty), None
+    positional = [p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+    return sum(1 for p in positional if p.default is p.empty), len(positional)
+
+
+class CallbackRouter:
+    """prefix -> handler(query, context, *args) table for CallbackQueryHandler
+
+    With auto_answer (default) the query is answered concurrently with the handler's screen
+    edit instead of before it, so a tap costs one API round trip of latency, not two.
+    Handlers that answer with their own text (toasts/alerts) register auto_answer=False.
+    Unknown prefixes and wrong argument counts get an alert instead of silence.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.unknown = 0
+
+    def register(self, prefix: str, handler, auto_answer: bool = True):
+        if not prefix or SEPARATOR in prefix:
+            raise ValueError(f"Invalid callback prefix: {prefix!r}")
+        if prefix in self.routes:
+            raise ValueError(f"Callback prefix already registered: {prefix!r}")
+        min_args, max_args = _arity(handler)
+        self.routes[prefix] = Route(handler, min_args, max_args, auto_answer)
+
+    async def dispatch(self, query, context) -> bool:
+        """Run the route for query.data; False if it was unknown or malformed"""
+        prefix, _, rest = (query.data or "").partition(SEPARATOR)
+        route = self.routes.get(prefix)
+        args = rest.split(SEPARATOR) if rest else []
+        if route is None or len(args) < route.min_args or (route.max_args is not None and len(args) > route.max_args):
+            self.unknown += 1
+            await query.answer(UNKNOWN_BUTTON_TEXT, show_alert=True)
+            return False
+
+        if not route.auto_answer:
+            await route.handler(query, context, *args)
+            return True
+        answer = asyncio.ensure_future(query.answer())
+        try:
+            await route.handler(query, context, *args)
+        finally:
+            try:
+                await answer
+            except TelegramError as e:
+                # Screen pehle hi dikh chuki hai - sirf spinner der se band hoga
+                logging.debug(f"answerCallbackQuery failed: {e}")
+        return True
@@ -0,0 +1,452 @@
+"""
+Screen rendering layer
+Static keyboards startup par ek baar bante hain, dynamic screens precompiled templates se
+render hote hain, aur same content wala edit Telegram ko bheja hi nahi jata
+"""
+
+import logging
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from router import callback_data
+
+APP_LINK = "https://example.com/internet-sell-app.apk"  # Replace with actual app link
+SHARE_TEXT = "Join%20Internet%20Sell%20App%20-%20Earn%20Money%20by%20selling%20internet!%20500MB%3D%E2%82%B9100%2C%201GB%3D%E2%82%B9200%20%F0%9F%92%B0"
+
+Screen = namedtuple("Screen", ["text", "reply_markup", "parse_mode"])
+
+
+# Static keyboards - ek baar build, har screen par reuse
+def _keyboard(*rows):
+    return InlineKeyboardMarkup([list(row) for row in rows])
+
+
+def channel_join_keyboard(channel_link: str):
+    return _keyboard(
+        [InlineKeyboardButton("📢 Join Channel", url=channel_link)],
+        [InlineKeyboardButton("✅ Verify Join", callback_data="verify_join")],
+    )
+
+
+_MENU_ROWS = (
+    [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
+    [InlineKeyboardButton("💰 Check Balance", callback_data="check_balance")],
+    [InlineKeyboardButton("🎁 Get App Link", callback_data="get_app_link")],
+)
+MAIN_MENU_KEYBOARD = _keyboard(*_MENU_ROWS)
+MAIN_MENU_WITHDRAW_KEYBOARD = _keyboard(
+    *_MENU_ROWS,
+    [InlineKeyboardButton("💸 Withdraw Earnings", callback_data="withdraw_earnings")],
+)
+BACK_KEYBOARD = _keyboard([InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")])
+REFER_OR_BACK_KEYBOARD = _keyboard(
+    [InlineKeyboardButton("📤 Get Referral Link", callback_data="get_referral")],
+    [InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")],
+)
+
+
+@lru_cache(maxsize=4096)
+def referral_keyboard(referral_link: str):
+    """Referral screen keyboard (share URL depends on the link, so interned per link)"""
+    return _keyboard(
+        [InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")],
+        [InlineKeyboardButton("📢 Share Link", url=f"https://t.me/share/url?url={referral_link}&text={SHARE_TEXT}")],
+    )
+
+
+# Screen texts
+WELCOME_TEXT = """
+🤖 **Welcome to Internet Sell App Bot!**
+
+💰 **Earn Money by Selling Internet:**
+
+📊 **Internet Selling Rates:**
+• 500MB Internet Sell = ₹100
+• 1GB Internet Sell = ₹200
+
+🎁 **How to Get Started:**
+1. Join our official channel
+2. Refer 10 friends to join
+3. Get Internet Sell App download link
+4. Start selling internet & earn money!
+
+👥 **Referral Program:**
+• ₹15 per successful referral
+• Minimum 10 referrals required for app access
+• **Withdrawal after 10 referrals only**
+• UPI withdrawal available
+
+👇 **Click below to join channel and start earning!**
+"""
+
+VERIFIED_TEXT = """
+✅ **Channel Join Verified Successfully!**
+
+🎉 **Welcome to Internet Sell App Program!**
+
+💰 **Earn Money by Selling Internet:**
+• 500MB Internet Sell = ₹100
+• 1GB Internet Sell = ₹200
+
+📊 **Next Steps:**
+1. Share your referral link with friends
+2. Get 10 referrals to unlock the app
+3. Earn ₹15 per referral
+4. **Withdrawal after 10 referrals only**
+5. UPI withdrawal available
+
+🎯 **Minimum 10 referrals required** to get:
+• Internet Sell App download link
+• Withdrawal access
+
+Use /referral to get your personal referral link!
+"""
+
+NOT_JOINED_TEXT = (
+    "❌ **You haven't joined the channel yet!**\n\n"
+    "Join the channel first, then tap ✅ Verify Join again."
+)
+
+VERIFIED_FALLBACK_TEXT = "✅ **Channel Join Verified!**\n\nUse /referral to get started!"
+
+MAIN_MENU_TEMPLATE = """
+🏠 **Main Menu - Internet Sell App**
+
+💰 **Earning Plan:**
+• 500MB Internet Sell = ₹100
+• 1GB Internet Sell = ₹200
+• ₹15 per referral
+
+📊 **Your Stats:**
+• Referrals: {referral_count}/10
+• Balance: ₹{balance}
+• App Access: {status_emoji}
+• Withdrawal Access: {withdrawal_emoji}
+
+🎯 **Requirements:**
+• Minimum 10 referrals for app access
+• Minimum 10 referrals for withdrawal
+• ₹15 per referral
+• UPI withdrawal available
+
+🔔 **Status:** {remaining_refs} referrals needed for full access
+""".format
+
+REFERRAL_TEMPLATE = """
+📤 **Your Referral System**
+
+🔗 **Your Referral Link:**
+`{referral_link}`
+
+📊 **Your Referrals:** {referral_count}/10
+💰 **Earnings:** ₹{earnings}
+💸 **Withdrawal Access:** {withdrawal_status}
+
+🎯 **Requirements:**
+• Minimum 10 referrals for app access
+• Minimum 10 referrals for withdrawal
+• ₹15 per successful referral
+• UPI withdrawal available
+
+💡 **How it works:**
+1. Share your referral link
+2. When friends join using your link, you get ₹15
+3. Complete 10 referrals to get:
+   • Internet Sell App download
+   • Withdrawal access
+4. Start selling internet: 500MB=₹100, 1GB=₹200
+""".format
+
+BALANCE_TEMPLATE = """
+💰 **Your Earnings Summary**
+
+📊 **Current Balance:** ₹{balance}
+👥 **Total Referrals:** {referral_count}
+💵 **Referral Earnings:** ₹{earnings}
+🎯 **Remaining for Full Access:** {remaining} referrals
+💸 **Withdrawal Access:** {withdrawal_status}
+
+💰 **Internet Selling Rates:**
+• 500MB Internet Sell = ₹100
+• 1GB Internet Sell = ₹200
+
+💸 **Withdrawal Info:**
+• Minimum withdrawal: ₹50
+• **Withdrawal after 10 referrals only**
+• UPI withdrawal available
+• Processed within 24 hours
+""".format
+
+APP_GRANTED_TEMPLATE = f"""
+🎉 **Congratulations! App Access Granted!**
+
+📲 **Download Internet Sell App:**
+{APP_LINK}
+
+💰 **Start Earning Money:**
+• 500MB Internet Sell = ₹100
+• 1GB Internet Sell = ₹200
+
+📊 **Your Referrals:** {{referral_count}}
+💵 **Referral Balance:** ₹{{earnings}}
+💸 **Withdrawal Access:** ✅ Available
+
+🚀 **Install the app and start selling internet today!**
+""".format
+
+APP_LOCKED_TEMPLATE = (
+    "❌ **App Access Not Available Yet!**\n\n"
+    "📊 **Your Progress:** {referral_count}/10 referrals\n"
+    "🎯 **Remaining:** {remaining} referrals needed\n\n"
+    "💡 **Complete {remaining} more referrals to get:**\n"
+    "• Internet Sell App download link\n"
+    "• Withdrawal access\n\n"
+    "💰 **Earning Potential after App Access:**\n"
+    "• 500MB Internet Sell = ₹100\n"
+    "• 1GB Internet Sell = ₹200"
+).format
+
+WITHDRAW_LOCKED_TEMPLATE = (
+    "❌ **Withdrawal Access Not Available!**\n\n"
+    "📊 **Your Referrals:** {referral_count}/10\n"
+    "🎯 **Remaining:** {remaining} referrals needed\n\n"
+    "💡 **Complete {remaining} more referrals to unlock withdrawal access!**\n\n"
+    "💰 **Current Balance:** ₹{balance}\n"
+    "💵 **You'll earn:** ₹{to_earn} more from referrals"
+).format
+
+WITHDRAW_REQUEST_TEMPLATE = """
+💸 **Withdrawal Request**
+
+💰 **Available Balance:** ₹{balance}
+👥 **Total Referrals:** {referral_count}/10 ✅
+💸 **Withdrawal Access:** ✅ Available
+
+📱 **Withdrawal Method:** UPI
+
+📝 **Process:**
+1. Minimum withdrawal: ₹50
+2. Processed within 24 hours
+3. UPI ID required
+
+📨 Please send your UPI ID to process withdrawal.
+
+Send your UPI ID in this format:
+`/withdraw your_upi_id@okbank`
+""".format
+
+WITHDRAW_LOW_BALANCE_TEMPLATE = (
+    "❌ **Insufficient Balance!**\n\n"
+    "💰 **Current Balance:** ₹{balance}\n"
+    "🎯 **Minimum Required:** ₹50\n\n"
+    "💡 **Complete more referrals to increase your balance!**\n"
+    "• ₹15 per referral\n"
+    "• Withdrawal access: ✅ Available\n"
+    "• Then earn: 500MB=₹100, 1GB=₹200"
+).format
+
+STATS_TEMPLATE = """
+📊 **Bot Stats**
+
+👥 **Users:** {users} ({verified_users} verified)
+🔗 **Referrals:** {referrals}
+💰 **Outstanding Balance:** ₹{outstanding_balance}
+💸 **Withdrawals:** {withdrawals} (₹{withdrawn_amount})
+
+📅 **Today (UTC):** {today_users} new users, {today_verified} verified, {today_referrals} referrals, {today_withdrawals} withdrawals
+📅 **Yesterday:** {yesterday_users} new users, {yesterday_verified} verified, {yesterday_referrals} referrals, {yesterday_withdrawals} withdrawals
+""".format
+
+
+def _withdrawal_status(referral_count: int, withdrawal_access) -> str:
+    return "✅ Available" if withdrawal_access else f"❌ Need {10 - referral_count} more referrals"
+
+
+# Screen renderers - state (cache.UserState ya None) se Screen banate hain
+def welcome_screen(channel_keyboard) -> Screen:
+    return Screen(WELCOME_TEXT, channel_keyboard, 'Markdown')
+
+
+def not_joined_screen(channel_keyboard) -> Screen:
+    return Screen(NOT_JOINED_TEXT, channel_keyboard, 'Markdown')
+
+
+def main_menu_screen(state) -> Screen:
+    referral_count = state.referral_count if state else 0
+    withdrawal_access = state.withdrawal_access if state else False
+    text = MAIN_MENU_TEMPLATE(
+        referral_count=referral_count,
+        balance=state.balance if state else 0,
+        status_emoji="✅" if state and state.app_access else "❌",
+        withdrawal_emoji="✅" if withdrawal_access else "❌",
+        remaining_refs=10 - referral_count,
+    )
+    keyboard = MAIN_MENU_WITHDRAW_KEYBOARD if withdrawal_access else MAIN_MENU_KEYBOARD
+    return Screen(text, keyboard, 'Markdown')
+
+
+def referral_screen(state, bot_username: str) -> Screen:
+    referral_link = f"https://t.me/{bot_username}?start={state.referral_code}"
+    text = REFERRAL_TEMPLATE(
+        referral_link=referral_link,
+        referral_count=state.referral_count,
+        earnings=state.referral_count * 15,
+        withdrawal_status=_withdrawal_status(state.referral_count, state.withdrawal_access),
+    )
+    return Screen(text, referral_keyboard(referral_link), 'Markdown')
+
+
+def balance_screen(state) -> Screen:
+    referral_count = state.referral_count if state else 0
+    text = BALANCE_TEMPLATE(
+        balance=state.balance if state else 0,
+        referral_count=referral_count,
+        earnings=referral_count * 15,
+        remaining=10 - referral_count,
+        withdrawal_status=_withdrawal_status(referral_count, state.withdrawal_access if state else False),
+    )
+    return Screen(text, BACK_KEYBOARD, 'Markdown')
+
+
+def app_granted_screen(referral_count: int) -> Screen:
+    return Screen(APP_GRANTED_TEMPLATE(referral_count=referral_count, earnings=referral_count * 15), None, 'Markdown')
+
+
+def app_locked_screen(referral_count: int) -> Screen:
+    text = APP_LOCKED_TEMPLATE(referral_count=referral_count, remaining=10 - referral_count)
+    return Screen(text, REFER_OR_BACK_KEYBOARD, None)
+
+
+def withdraw_screen(state) -> Screen:
+    balance = state.balance if state else 0
+    referral_count = state.referral_count if state else 0
+    if not (state and state.withdrawal_access):
+        remaining = 10 - referral_count
+        text = WITHDRAW_LOCKED_TEMPLATE(
+            referral_count=referral_count, remaining=remaining, balance=balance, to_earn=remaining * 15
+        )
+        return Screen(text, REFER_OR_BACK_KEYBOARD, None)
+    if balance >= 50:
+        return Screen(WITHDRAW_REQUEST_TEMPLATE(balance=balance, referral_count=referral_count), None, 'Markdown')
+    return Screen(WITHDRAW_LOW_BALANCE_TEMPLATE(balance=balance), REFER_OR_BACK_KEYBOARD, None)
+
+
+def stats_screen(stats) -> Screen:
+    totals = stats.totals
+    daily = {}
+    for prefix, bucket in (("today", stats.today), ("yesterday", stats.yesterday)):
+        for name in ("users", "verified", "referrals", "withdrawals"):
+            daily[f"{prefix}_{name}"] = bucket.get(name, 0)
+    text = STATS_TEMPLATE(
+        users=totals.get("users", 0),
+        verified_users=totals.get("verified_users", 0),
+        referrals=totals.get("referrals", 0),
+        outstanding_balance=totals.get("outstanding_balance", 0),
+        withdrawals=totals.get("withdrawals", 0),
+        withdrawn_amount=totals.get("withdrawn_amount", 0),
+        **daily,
+    )
+    return Screen(text, None, 'Markdown')
+
+
+def top_screen(entries, first_rank: int, page_size: int) -> Screen:
+    """Leaderboard page; plain text because usernames can contain Markdown characters"""
+    if not entries:
+        return Screen("🏆 No more referrers.", None, None)
+    lines = [f"🏆 Top referrers (#{first_rank}-#{first_rank + len(entries) - 1})", ""]
+    for rank, entry in enumerate(entries, first_rank):
+        name = f"@{entry.username}" if entry.username else (entry.first_name or "-")
+        lines.append(f"{rank}. {name} ({entry.user_id}) - {entry.referral_count} referrals, ₹{entry.balance}")
+    keyboard = None
+    if len(entries) == page_size:
+        last = entries[-1]
+        keyboard = _keyboard([InlineKeyboardButton(
+            "Next ▶️", callback_data=callback_data("top", first_rank + len(entries), last.referral_count, last.user_id)
+        )])
+    return Screen("\n".join(lines), keyboard, None)
+
+
+def downline_screen(result) -> Screen:
+    """Downline size per level"""
+    if not result.total:
+        return Screen(f"🌳 User {result.user_id} has no downline yet.", None, None)
+    lines = [f"🌳 Downline of {result.user_id}: {result.total} users in {len(result.levels)} levels", ""]
+    for depth, size in result.levels:
+        lines.append(f"Level {depth}: {size}")
+    return Screen("\n".join(lines), None, None)
+
+
+def upline_screen(user_id: int, entries) -> Screen:
+    """Referrer chain, nearest first; plain text because usernames can contain Markdown characters"""
+    if not entries:
+        return Screen(f"⬆️ User {user_id} was not referred by anyone.", None, None)
+    lines = [f"⬆️ Upline of {user_id}", ""]
+    for entry in entries:
+        name = f"@{entry.username}" if entry.username else (entry.first_name or "-")
+        lines.append(f"Level {entry.depth}: {name} ({entry.user_id})")
+    return Screen("\n".join(lines), None, None)
+
+
+class ScreenPresenter:
+    """Sends screens - reply for commands, edit for button taps
+
+    Remembers a hash of what each message currently shows (bounded LRU), and skips an
+    edit whose text + keyboard hash is unchanged instead of paying a round trip that
+    Telegram would reject with "message is not modified".
+    """
+
+    def __init__(self, max_messages: int = 50000):
+        self.max_messages = max_messages
+        self._shown = OrderedDict()
+        self.skipped_edits = 0
+
+    @staticmethod
+    def _fingerprint(screen: Screen) -> int:
+        return hash(screen)
+
+    def _remember(self, key, fingerprint: int):
+        self._shown[key] = fingerprint
+        self._shown.move_to_end(key)
+        if len(self._shown) > self.max_messages:
+            self._shown.popitem(last=False)
+
+    @staticmethod
+    def _message_key(query):
+        if query.message is not None:
+            return (query.message.chat.id, query.message.message_id)
+        return query.inline_message_id
+
+    async def show(self, target, screen: Screen):
+        """Show a screen for a CallbackQuery (edit) or an Update/Message (reply)"""
+        if hasattr(target, "edit_message_text"):
+            return await self.edit(target, screen)
+        message = target.effective_message if hasattr(target, "effective_message") else target
+        return await self.reply(message, screen)
+
+    async def reply(self, message, screen: Screen):
+        sent = await message.reply_text(screen.text, reply_markup=screen.reply_markup, parse_mode=screen.parse_mode)
+        self._remember((sent.chat.id, sent.message_id), self._fingerprint(screen))
+        return sent
+
+    async def edit(self, query, screen: Screen):
+        key = self._message_key(query)
+        fingerprint = self._fingerprint(screen)
+        if key is not None and self._shown.get(key) == fingerprint:
+            self._shown.move_to_end(key)
+            self.skipped_edits += 1
+            return None
+        try:
+            result = await query.edit_message_text(
+                screen.text, reply_markup=screen.reply_markup, parse_mode=screen.parse_mode
+            )
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            logging.debug(f"Edit skipped by Telegram: {e}")
+            result = None
+        if key is not None:
+            self._remember(key, fingerprint)
+        return result
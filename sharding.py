@@ -0,0 +1,311 @@
+"""
+Sharded deployment (ek hi box par)
+Front dispatcher Telegram ke webhook updates leta hai aur user_id ke hash se N worker processes
+mein se ek ko bhejta hai. Har worker normal RenderInternetBot hai (webhook mode, localhost par),
+sab ek hi SQLite file (WAL) share karte hain. Referral credit ki DB write atomic rehti hai -
+sirf uske side effects (cache, notification) referrer ke owner worker ko jaate hain.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import signal
+import subprocess
+import time
+
+import httpx
+from telegram import Update
+
+from http_server import HTTPServer, text_response
+from webhook import SECRET_HEADER
+
+SHARD_SECRET_HEADER = "x-shard-secret"
+UPDATES_ROUTE = "/internal/updates"
+REFERRALS_ROUTE = "/internal/referrals"
+MAX_BATCH = 100
+
+
+def shard_for(user_id: int, shard_count: int) -> int:
+    """Owning shard of a user - Fibonacci hashing, so sequential ids spread evenly
+
+    The shard comes from the high bits of the 64-bit product (multiply-shift range
+    reduction); its low bits are just user_id's low bits for power-of-two counts.
+    """
+    return (((user_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) * shard_count) >> 64
+
+
+def update_owner(data: dict) -> int:
+    """User id of a raw update (sender, else chat) without building Update objects; 0 if none
+
+    Same choice as concurrency.update_key, so a user's updates always land on one worker -
+    except chat_member updates, which go to the member whose status changed (not the admin).
+    """
+    for key, value in data.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        sender = (value.get("new_chat_member") or {}).get("user") or value.get("from") or value.get("user")
+        if isinstance(sender, dict) and "id" in sender:
+            return sender["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return 0
+
+
+def _authorized(request, secret: str) -> bool:
+    return hmac.compare_digest(request.headers.get(SHARD_SECRET_HEADER, ''), secret)
+
+
+class BatchSender:
+    """Ordered delivery of JSON items to one worker route, batching whatever queued up meanwhile
+
+    submit() returns a future resolved once the worker accepted the item. Failed posts are
+    retried a few times (worker restart) before the futures fail.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, url: str, secret: str, retries: int = 3):
+        self.client = client
+        self.url = url
+        self.secret = secret
+        self.retries = retries
+        self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, item: bytes) -> asyncio.Future:
+        """item = one JSON-encoded value"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+        return future
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            body = b"[" + b",".join(item for item, _ in batch) + b"]"
+            error = await self._post(body)
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def _post(self, body: bytes):
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.post(
+                    self.url, content=body,
+                    headers={SHARD_SECRET_HEADER: self.secret, "content-type": "application/json"},
+                )
+                if response.status_code == 200:
+                    return None
+                error = RuntimeError(f"{self.url} answered {response.status_code}")
+            except httpx.HTTPError as e:
+                error = e
+            if attempt < self.retries:
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        logging.error(f"Shard delivery to {self.url} failed: {error}")
+        return error
+
+
+class ShardDispatcher:
+    """Public webhook endpoint that forwards each update to its user's worker"""
+
+    def __init__(self, listen: str, port: int, path: str, worker_urls, shard_secret: str,
+                 secret_token: str = "", max_connections: int = 40):
+        self.path = path if path.startswith('/') else f'/{path}'
+        self.secret_token = secret_token
+        self.worker_urls = list(worker_urls)
+        self.shard_secret = shard_secret
+        self.server = HTTPServer(listen, port, max_connections=max_connections)
+        self.server.route('POST', self.path, self.handle_update)
+        self.server.route('GET', '/', self.health)
+        self.client = None
+        self.senders = []
+        self.forwarded = [0] * len(self.worker_urls)
+
+    async def health(self, request):
+        return text_response(200, "OK")
+
+    async def handle_update(self, request):
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ''), self.secret_token
+        ):
+            return text_response(403, "forbidden")
+        try:
+            data = json.loads(request.body)
+            shard = shard_for(update_owner(data), len(self.senders))
+        except (ValueError, TypeError, AttributeError) as e:
+            logging.warning(f"Bad webhook payload: {e}")
+            return text_response(400, "bad update")
+        try:
+            # Worker ne update le liya tabhi 200 - warna Telegram dobara bhejega
+            await self.senders[shard].submit(request.body)
+        except Exception:
+            return text_response(503, "worker unavailable")
+        self.forwarded[shard] += 1
+        return text_response(200, "")
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=10)
+        self.senders = [
+            BatchSender(self.client, url + UPDATES_ROUTE, self.shard_secret) for url in self.worker_urls
+        ]
+        for sender in self.senders:
+            sender.start()
+        await self.server.start()
+
+    async def stop(self):
+        await self.server.stop()
+        for sender in self.senders:
+            await sender.stop()
+        if self.client is not None:
+            await self.client.aclose()
+
+
+class ShardPeers:
+    """A worker's view of the cluster: internal routes and referral side effects for other shards"""
+
+    def __init__(self, index: int, count: int, base_port: int, secret: str):
+        self.index = index
+        self.count = count
+        self.base_port = base_port
+        self.secret = secret
+        self.client = None
+        self.senders = {}
+        self.remote_referrals = 0
+
+    def owns(self, user_id: int) -> bool:
+        return shard_for(user_id, self.count) == self.index
+
+    def routes(self, application, on_referral) -> dict:
+        """Extra webhook-server routes: batched updates from the dispatcher, referrals from peers"""
+        async def receive_updates(request):
+            if not _authorized(request, self.secret):
+                return text_response(403, "forbidden")
+            for data in json.loads(request.body):
+                update = Update.de_json(data, application.bot)
+                if update is not None:
+                    await application.update_queue.put(update)
+            return text_response(200, "")
+
+        async def receive_referrals(request):
+            if not _authorized(request, self.secret):
+                return text_response(403, "forbidden")
+            for referrer_id, state in json.loads(request.body):
+                on_referral(referrer_id, state)
+            return text_response(200, "")
+
+        return {('POST', UPDATES_ROUTE): receive_updates, ('POST', REFERRALS_ROUTE): receive_referrals}
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=10)
+        for shard in range(self.count):
+            if shard != self.index:
+                url = f"http://127.0.0.1:{self.base_port + shard}{REFERRALS_ROUTE}"
+                self.senders[shard] = BatchSender(self.client, url, self.secret)
+                self.senders[shard].start()
+
+    async def stop(self):
+        # Queue mein pade referrals bhej do (thodi der tak)
+        deadline = time.monotonic() + 5
+        while any(not sender.queue.empty() for sender in self.senders.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for sender in self.senders.values():
+            await sender.stop()
+        self.senders = {}
+        if self.client is not None:
+            await self.client.aclose()
+
+    def send_referral(self, referrer_id: int, state):
+        """Hand a committed credit's side effects to the referrer's owner - never blocks"""
+        sender = self.senders.get(shard_for(referrer_id, self.count))
+        if sender is None:
+            logging.warning(f"No shard link for referrer {referrer_id}, notification dropped")
+            return
+        self.remote_referrals += 1
+        future = sender.submit(json.dumps([referrer_id, list(state)]).encode())
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+async def _wait_healthy(client: httpx.AsyncClient, url: str, process, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if (await client.get(url)).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    return False
+
+
+async def run_cluster(command, shard_count: int, base_port: int, worker_env, listen: str, port: int,
+                      path: str, secret_token: str = "", max_connections: int = 40, on_ready=None):
+    """Run shard_count worker processes plus the dispatcher until SIGINT/SIGTERM
+
+    worker_env(index, shard_secret) returns the environment for worker `index`, which must
+    serve its webhook receiver on 127.0.0.1:base_port+index. Dead workers are restarted.
+    on_ready is awaited once everything accepts traffic (e.g. to call setWebhook).
+    """
+    shard_secret = secrets.token_hex(16)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def spawn(index: int):
+        return subprocess.Popen(command, env=worker_env(index, shard_secret))
+
+    workers = [spawn(index) for index in range(shard_count)]
+    worker_urls = [f"http://127.0.0.1:{base_port + index}" for index in range(shard_count)]
+    dispatcher = ShardDispatcher(listen, port, path, worker_urls, shard_secret, secret_token, max_connections)
+    try:
+        async with httpx.AsyncClient(timeout=2) as client:
+            for index, url in enumerate(worker_urls):
+                if not await _wait_healthy(client, url + "/", workers[index], 60):
+                    raise RuntimeError(f"Worker {index} did not start")
+        await dispatcher.start()
+        print(f"✅ Dispatcher listening on {listen}:{dispatcher.server.port}{dispatcher.path} -> {shard_count} workers")
+        if on_ready is not None:
+            await on_ready()
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            for index, worker in enumerate(workers):
+                if worker.poll() is not None and not stop_event.is_set():
+                    print(f"❌ Worker {index} exited with code {worker.returncode}, restarting")
+                    workers[index] = spawn(index)
+    finally:
+        await dispatcher.stop()
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGTERM)
+        for index, worker in enumerate(workers):
+            try:
+                await loop.run_in_executor(None, worker.wait, 30)
+            except subprocess.TimeoutExpired:
+                logging.warning(f"Worker {index} did not stop, killing it")
+                worker.kill()
+        print(f"📊 Dispatcher forwarded per shard: {dispatcher.forwarded}")
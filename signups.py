@@ -0,0 +1,135 @@
+"""
+Signup membership index
+Har registered (aur referred) user_id ek compact in-memory hash set mein. /start isse decide karta
+hai: hit = purana user (referrer lookup / credit path nahi, deep link sirf repeat gina jata hai),
+miss = naya user, seedha register_user - pehle koi read nahi. Source of truth phir bhi DB hai:
+users ka PK aur idx_referrals_referred unique index. Index kabhi peeche ho (dusre process ne user
+banaya) to register_user ka insert conflict khud sambhal leta hai - credit kabhi nahi hota.
+"""
+
+from array import array
+
+REGISTERED = 0x01
+REFERRED = 0x02
+
+EMPTY = 0
+MAX_LOAD = 0.5
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class SignupIndex:
+    """Open-addressing user_id set with REGISTERED / REFERRED flags (~18 bytes per user)
+
+    Same layout as the UserStore index: array('q') keys, linear probing on a Fibonacci
+    hash, resized at MAX_LOAD. Ids are never removed - users are never deleted.
+
+    A miss only means "new user" once load() has finished (`loaded`); before that (or if
+    it failed) callers must ask the database.
+    """
+
+    def __init__(self, owns=None):
+        # Sharded worker - sirf apne users (baaki ke /start is worker tak aate hi nahi)
+        self.owns = owns
+        self.loaded = False
+        self.size = 0
+        self.referred = 0
+        self.new_signups = 0
+        self.repeat_starts = 0
+        self.repeat_referred = 0
+        self._resize(1024)
+
+    def _resize(self, capacity: int):
+        old_keys, old_flags = getattr(self, "_keys", ()), getattr(self, "_flags", b"")
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._limit = int(capacity * MAX_LOAD)
+        self._keys = array('q', bytes(8 * capacity))
+        self._flags = bytearray(capacity)
+        for key, flags in zip(old_keys, old_flags):
+            if key != EMPTY:
+                slot = self._slot(key)
+                self._keys[slot] = key
+                self._flags[slot] = flags
+
+    def _slot(self, user_id: int) -> int:
+        """Slot holding user_id, or the empty slot where it would go"""
+        keys, mask = self._keys, self._mask
+        slot = ((user_id * _GOLDEN) & _MASK64) >> self._shift
+        while True:
+            key = keys[slot]
+            if key == user_id or key == EMPTY:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _mark(self, user_id: int, flags: int):
+        slot = self._slot(user_id)
+        if self._keys[slot] == EMPTY:
+            if self.size + 1 > self._limit:
+                self._resize(len(self._keys) * 2)
+                slot = self._slot(user_id)
+            self._keys[slot] = user_id
+            self.size += 1
+        if flags & REFERRED and not self._flags[slot] & REFERRED:
+            self.referred += 1
+        self._flags[slot] |= flags
+
+    def flags(self, user_id: int) -> int:
+        """REGISTERED / REFERRED bits of user_id, 0 if unknown"""
+        slot = self._slot(user_id)
+        return self._flags[slot] if self._keys[slot] == user_id else 0
+
+    def registered(self, user_id: int) -> bool:
+        return bool(self.flags(user_id) & REGISTERED)
+
+    def add(self, user_id: int, referred: bool = False):
+        """Record a committed registration (and its referral credit)"""
+        if user_id == EMPTY:
+            return
+        if not self.registered(user_id):
+            self.new_signups += 1
+        self._mark(user_id, REGISTERED | (REFERRED if referred else 0))
+
+    def remember(self, user_id: int):
+        """Record an existing user the index missed (found in the database, not a new signup)"""
+        if user_id != EMPTY:
+            self._mark(user_id, REGISTERED)
+
+    def reject_repeat(self, user_id: int):
+        """Count a deep-link /start by an already registered user - it never earns a credit"""
+        self.repeat_starts += 1
+        if self.flags(user_id) & REFERRED:
+            self.repeat_referred += 1
+
+    def load(self, conn) -> int:
+        """Build from users + referrals (runs on the DB thread); returns the number of users"""
+        owns = self.owns
+        self.loaded = False
+        expected = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        capacity = 1024
+        while capacity * MAX_LOAD < expected:
+            capacity *= 2
+        self.size = self.referred = 0
+        self._keys = self._flags = ()
+        self._resize(capacity)
+        for user_id, in conn.execute("SELECT user_id FROM users"):
+            if user_id != EMPTY and (owns is None or owns(user_id)):
+                self._mark(user_id, REGISTERED)
+        for user_id, in conn.execute("SELECT referred_id FROM referrals"):
+            if user_id != EMPTY and (owns is None or owns(user_id)):
+                self._mark(user_id, REFERRED)
+        self.loaded = True
+        return self.size
+
+    def memory_bytes(self) -> int:
+        return self._keys.itemsize * len(self._keys) + len(self._flags)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "referred": self.referred,
+            "new_signups": self.new_signups,
+            "repeat_starts": self.repeat_starts,
+            "repeat_referred": self.repeat_referred,
+            "memory_mb": round(self.memory_bytes() / 1048576, 2),
+        }
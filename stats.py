@@ -0,0 +1,40 @@
+"""
+Aggregate stats readers
+stats_counters / stats_daily migration 4 ke triggers maintain karte hain - yahan sirf O(1)
+reads hain, aur /top ke liye referral_count index par keyset pagination
+"""
+
+from collections import namedtuple
+
+TOP_PAGE_SIZE = 10
+
+Stats = namedtuple("Stats", ["totals", "today", "yesterday"])
+TopEntry = namedtuple("TopEntry", ["user_id", "username", "first_name", "referral_count", "balance"])
+
+
+def load_stats(conn) -> Stats:
+    """Global counters plus today's and yesterday's (UTC) buckets"""
+    totals = dict(conn.execute("SELECT name, value FROM stats_counters").fetchall())
+    today, yesterday = {}, {}
+    rows = conn.execute(
+        "SELECT day = date('now'), name, value FROM stats_daily WHERE day >= date('now', '-1 day')"
+    ).fetchall()
+    for is_today, name, value in rows:
+        (today if is_today else yesterday)[name] = value
+    return Stats(totals, today, yesterday)
+
+
+def top_referrers(conn, limit: int = TOP_PAGE_SIZE, after=None):
+    """Users by referral_count DESC, user_id DESC; after = (referral_count, user_id) of the previous page's last row"""
+    columns = "user_id, username, first_name, referral_count, balance"
+    if after is None:
+        rows = conn.execute(
+            f"SELECT {columns} FROM users ORDER BY referral_count DESC, user_id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            f"SELECT {columns} FROM users WHERE (referral_count, user_id) < (?, ?) "
+            "ORDER BY referral_count DESC, user_id DESC LIMIT ?",
+            (after[0], after[1], limit)
+        ).fetchall()
+    return [TopEntry(*row) for row in rows]
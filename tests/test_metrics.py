@@ -0,0 +1,29 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import PhaseTimer, statement_label
+
+
+class StatementLabelTest(unittest.TestCase):
+    def test_labels_are_cached(self):
+        # DB observer har statement par label banata hai - regex sirf pehli baar chale
+        self.assertTrue(hasattr(statement_label, 'cache_info'))
+        statement_label.cache_clear()
+        statement_label("SELECT 1 FROM users WHERE user_id = ?")
+        statement_label("SELECT 1 FROM users WHERE user_id = ?")
+        self.assertEqual(statement_label.cache_info().hits, 1)
+
+    def test_label(self):
+        self.assertEqual(statement_label("UPDATE users SET balance = 0"), "UPDATE users")
+        self.assertEqual(statement_label("INSERT INTO referrals VALUES (?, ?)"), "INSERT referrals")
+
+    def test_phase_timer_is_a_class(self):
+        self.assertIsInstance(PhaseTimer(), PhaseTimer)
+        self.assertIsNot(PhaseTimer(1.0), PhaseTimer(1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Compact update traces
+Ek line = ek update: [ms_since_start, kind, user_id, payload] - kind "m" text message
+(commands, deep links), "q" button tap (callback data). Live bot TRACE_FILE se record karta
+hai, load test inhe fake Bot API ke through replay karta hai
+"""
+
+import json
+import random
+import time
+
+MESSAGE = "m"
+CALLBACK = "q"
+BUTTONS = ("main_menu", "check_balance", "get_referral", "get_app_link", "withdraw_earnings")
+
+
+def command_update(update_id: int, user_id: int, text: str) -> dict:
+    """Private-chat text message update (with a bot_command entity for /commands)"""
+    message = {
+        "message_id": update_id, "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"},
+        "text": text,
+    }
+    if text.startswith('/'):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    """Button tap on a message the bot sent to the user"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": str(user_id), "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"},
+            "message": {
+                "message_id": update_id, "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"}, "text": "menu",
+            },
+        },
+    }
+
+
+def to_update(entry, update_id: int) -> dict:
+    """Trace entry -> Bot API update dict"""
+    _, kind, user_id, payload = entry
+    if kind == CALLBACK:
+        return callback_update(update_id, user_id, payload)
+    return command_update(update_id, user_id, payload)
+
+
+def load_trace(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_trace(path: str, entries):
+    with open(path, 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+
+
+def generate_trace(starts: int, taps: int, codes, users: int, first_new_user: int = 10_000_000,
+                   rate: float = 0, seed: int = 7) -> list:
+    """Synthetic burst: `starts` deep-link signups using `codes` plus `taps` button taps by users 1..users
+
+    rate = updates per second (0 = everything at t=0).
+    """
+    rng = random.Random(seed)
+    entries = []
+    for i in range(starts):
+        text = f"/start {rng.choice(codes)}" if codes else "/start"
+        entries.append([0, MESSAGE, first_new_user + i, text])
+    for _ in range(taps):
+        entries.append([0, CALLBACK, rng.randint(1, max(users, 1)), rng.choice(BUTTONS)])
+    rng.shuffle(entries)
+    if rate > 0:
+        for i, entry in enumerate(entries):
+            entry[0] = int(i * 1000 / rate)
+    return entries
+
+
+class TraceRecorder:
+    """TypeHandler callback appending every incoming message/tap to a trace file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._file = open(path, 'a')
+        self._started = time.monotonic()
+
+    async def record(self, update, context):
+        if update.callback_query is not None and update.callback_query.data is not None:
+            kind, payload, user = CALLBACK, update.callback_query.data, update.callback_query.from_user
+        elif update.message is not None and update.message.text is not None:
+            kind, payload, user = MESSAGE, update.message.text, update.effective_user
+        else:
+            return
+        if user is None:
+            return
+        offset = int((time.monotonic() - self._started) * 1000)
+        self._file.write(json.dumps([offset, kind, user.id, payload], separators=(',', ':')) + "\n")
+        self.recorded += 1
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,350 @@
+"""
+Compact in-memory user store (USER_STORE=memory)
+Har user ki hot state array columns mein rehti hai - per-user dict/tuple nahi - isliye
+millions of users kuch MB mein aa jaate hain aur reads pure memory lookups hain.
+SQLite hi source of truth hai: writes commit ke baad yahan write-through hote hain (sirf memory,
+event loop par koi disk I/O nahi). Clean shutdown par ek snapshot likha jata hai jo agle start par
+padh kar hata diya jata hai - crash ke baad snapshot hota hi nahi, to users table se rebuild.
+"""
+
+import logging
+import os
+import struct
+from array import array
+
+from cache import USER_STATE_COLUMNS, UserState
+
+JOINED_CHANNEL = 0x01
+APP_ACCESS = 0x02
+WITHDRAWAL_ACCESS = 0x04
+
+# 002 - snapshot sirf clean shutdown ka; purane (log wale) format ki files ignore hoti hain
+SNAPSHOT_MAGIC = b"USNAP002"
+# magic, users write sequence (stats_counters.user_writes), code width, user count
+SNAPSHOT_HEADER = struct.Struct("<8sQIQ")
+
+EMPTY = 0
+MAX_LOAD = 0.5
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+# flags byte -> 1 agar joined_channel set ho (verified users ginne ke liye)
+_JOINED_TABLE = bytes(1 if value & JOINED_CHANNEL else 0 for value in range(256))
+_new_tuple = tuple.__new__
+
+
+class UserStore:
+    """Array-backed user_id -> UserState map with the UserStateCache interface
+
+    Layout: an open-addressing index (array('q') of user ids, array('i') of row numbers,
+    linear probing on a Fibonacci hash) over dense per-row columns - user_id, referral_count
+    (int32), balance (int64), a flags bytearray and fixed-width referral codes - about
+    40-60 bytes per user including index slack.
+
+    Unlike the LRU cache every user is held, so get() misses only for unknown or
+    invalidated users. invalidate() marks a user stale until a database read fill()s it;
+    fill() never overwrites state written after its token, same contract as the cache.
+
+    With a path, close() writes <path>.snap (atomic replace) and load() consumes it - the
+    file is removed before the bot serves anything, so it only exists while the bot is
+    cleanly stopped. A crash leaves no snapshot and the next start rebuilds from the
+    users table; a write committed just before the crash can never be lost that way.
+    The snapshot also records the users write sequence, so any users write made after
+    it (another process, a manual fix) forces a rebuild too.
+    """
+
+    def __init__(self, path: str = None, code_width: int = 8, owns=None):
+        self.path = path
+        # Sharded worker - sirf apne users rakho
+        self.owns = owns
+        self.hits = 0
+        self.misses = 0
+        self._clock = 0
+        # user_id -> invalidate stamp
+        self._stale = {}
+        # stats_counters.user_writes jab store database se match karta tha (load ke waqt)
+        self.write_sequence = None
+        self._reset(code_width, 0)
+
+    def _reset(self, code_width: int, expected: int):
+        self.code_width = code_width
+        self.user_ids = array('q')
+        self.referral_counts = array('i')
+        self.balances = array('q')
+        self.flags = bytearray()
+        self.codes = bytearray()
+        self._stale.clear()
+        capacity = 1024
+        while capacity * MAX_LOAD < expected:
+            capacity *= 2
+        self._resize(capacity)
+
+    # Index
+
+    def _resize(self, capacity: int):
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._keys = array('q', bytes(8 * capacity))
+        self._rows = array('i', bytes(4 * capacity))
+        for row, user_id in enumerate(self.user_ids):
+            slot = self._slot(user_id)
+            self._keys[slot] = user_id
+            self._rows[slot] = row
+
+    def _slot(self, user_id: int) -> int:
+        """Slot holding user_id, or the empty slot where it would go"""
+        keys, mask = self._keys, self._mask
+        slot = ((user_id * _GOLDEN) & _MASK64) >> self._shift
+        while True:
+            key = keys[slot]
+            if key == user_id or key == EMPTY:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _row(self, user_id: int) -> int:
+        slot = self._slot(user_id)
+        return self._rows[slot] if self._keys[slot] == user_id else -1
+
+    # Rows
+
+    def _state(self, row: int) -> UserState:
+        width = self.code_width
+        start = row * width
+        code = self.codes[start:start + width].rstrip(b"\0")
+        flags = self.flags[row]
+        # tuple.__new__ - namedtuple ke __new__ se kaafi sasta, har read par banta hai
+        return _new_tuple(UserState, (
+            code.decode() if code else None,
+            flags & JOINED_CHANNEL,
+            self.referral_counts[row],
+            self.balances[row],
+            (flags & APP_ACCESS) >> 1,
+            (flags & WITHDRAWAL_ACCESS) >> 2,
+        ))
+
+    @staticmethod
+    def _flags(state: UserState) -> int:
+        return (
+            (JOINED_CHANNEL if state.joined_channel else 0)
+            | (APP_ACCESS if state.app_access else 0)
+            | (WITHDRAWAL_ACCESS if state.withdrawal_access else 0)
+        )
+
+    def _set(self, user_id: int, referral_count: int, balance: int, flags: int, code: bytes):
+        if user_id == EMPTY:
+            raise ValueError("user_id 0 is reserved")
+        slot = self._slot(user_id)
+        if self._keys[slot] == user_id:
+            row = self._rows[slot]
+            self.referral_counts[row] = referral_count
+            self.balances[row] = balance
+            self.flags[row] = flags
+            width = self.code_width
+            self.codes[row * width:(row + 1) * width] = code.ljust(width, b"\0")
+            return
+        row = len(self.user_ids)
+        self._keys[slot] = user_id
+        self._rows[slot] = row
+        self.user_ids.append(user_id)
+        self.referral_counts.append(referral_count)
+        self.balances.append(balance)
+        self.flags.append(flags)
+        self.codes += code.ljust(self.code_width, b"\0")
+        if len(self.user_ids) > self._capacity * MAX_LOAD:
+            self._resize(self._capacity * 2)
+
+    def _widen_codes(self, width: int):
+        """Re-pack the code column for longer referral codes (REFERRAL_CODE_LENGTH badhne par)"""
+        old, old_width = self.codes, self.code_width
+        self.codes = bytearray()
+        for row in range(len(self.user_ids)):
+            self.codes += old[row * old_width:(row + 1) * old_width].ljust(width, b"\0")
+        self.code_width = width
+
+    # UserStateCache interface
+
+    def get(self, user_id: int):
+        """Return the user's UserState, or None if unknown or invalidated"""
+        if user_id not in self._stale:
+            row = self._row(user_id)
+            if row >= 0:
+                self.hits += 1
+                return self._state(row)
+        self.misses += 1
+        return None
+
+    def snapshot(self) -> int:
+        """Token to pass to fill() - take it before starting the database read"""
+        return self._clock
+
+    def fill(self, user_id: int, state: UserState, token: int):
+        """Store a row read from the database unless a newer write already happened"""
+        stamp = self._stale.get(user_id)
+        if stamp is None:
+            if self._row(user_id) >= 0:
+                # Row current hai (put() read ke baad hua) - purana read use nahi karte
+                return
+        elif stamp > token:
+            return
+        self.put(user_id, state)
+
+    def put(self, user_id: int, state: UserState):
+        """Write-through after a database write for this user"""
+        if self.owns is not None and not self.owns(user_id):
+            return
+        code = (state.referral_code or "").encode()
+        if len(code) > self.code_width:
+            self._widen_codes(len(code))
+        self._clock += 1
+        self._stale.pop(user_id, None)
+        self._set(user_id, state.referral_count, state.balance, self._flags(state), code)
+
+    def invalidate(self, user_id: int):
+        """Forget a user's state after a write whose result we don't have"""
+        self._clock += 1
+        self._stale[user_id] = self._clock
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.user_ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale": len(self._stale),
+            "memory_mb": round(self.memory_bytes() / 1e6, 1),
+        }
+
+    def memory_bytes(self) -> int:
+        columns = (self.user_ids, self.referral_counts, self.balances)
+        index = self._keys.itemsize * len(self._keys) + self._rows.itemsize * len(self._rows)
+        return index + sum(c.itemsize * len(c) for c in columns) + len(self.flags) + len(self.codes)
+
+    # Persistence
+
+    def load(self, conn) -> str:
+        """Fill the store at startup (runs on the DB thread); returns where the state came from
+
+        The clean-shutdown snapshot is used (and removed) only if the users write sequence
+        and totals in stats_counters (kept by the users table triggers) still match it.
+        Otherwise (first run, crash, writes while we were down, sharded worker) the users
+        table is scanned.
+        """
+        conn.execute("BEGIN")
+        try:
+            totals = self._totals(conn)
+            self.write_sequence = totals.get('user_writes')
+            snapshot = None
+            if self.path is not None and self.owns is None:
+                snapshot = self._load_snapshot()
+            if snapshot is not None:
+                if snapshot == self.write_sequence and self._matches(totals):
+                    return "snapshot"
+                logging.warning("User store snapshot is behind the database, rebuilding from users table")
+            self.rebuild(conn)
+        finally:
+            conn.execute("COMMIT")
+        return "users table"
+
+    def rebuild(self, conn):
+        """Load every (owned) user from the users table"""
+        longest = conn.execute("SELECT MAX(LENGTH(referral_code)) FROM users").fetchone()[0] or 0
+        count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        self._reset(max(self.code_width, longest), count)
+        cursor = conn.execute(f"SELECT user_id, {USER_STATE_COLUMNS} FROM users")
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for row in rows:
+                if self.owns is not None and not self.owns(row[0]):
+                    continue
+                state = UserState(*row[1:])
+                self._set(row[0], state.referral_count, state.balance, self._flags(state),
+                          (state.referral_code or "").encode())
+
+    @staticmethod
+    def _totals(conn) -> dict:
+        return dict(conn.execute(
+            "SELECT name, value FROM stats_counters"
+            " WHERE name IN ('users', 'verified_users', 'outstanding_balance', 'user_writes')"
+        ).fetchall())
+
+    def _matches(self, totals: dict) -> bool:
+        return (
+            totals.get('users') == len(self.user_ids)
+            and totals.get('verified_users') == self.flags.translate(_JOINED_TABLE).count(1)
+            and totals.get('outstanding_balance') == sum(self.balances)
+        )
+
+    def _load_snapshot(self):
+        """Read and remove <path>.snap; returns its write sequence, None if unusable"""
+        snap_path = self.path + ".snap"
+        try:
+            with open(snap_path, "rb") as f:
+                magic, sequence, width, count = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+                if magic != SNAPSHOT_MAGIC:
+                    return None
+                self._reset(width, count)
+                user_ids, referral_counts, balances = array('q'), array('i'), array('q')
+                user_ids.fromfile(f, count)
+                referral_counts.fromfile(f, count)
+                balances.fromfile(f, count)
+                flags = bytearray(f.read(count))
+                codes = bytearray(f.read(count * width))
+                (stale_count,) = struct.unpack("<Q", f.read(8))
+                stale = array('q')
+                stale.fromfile(f, stale_count)
+                if len(flags) != count or len(codes) != count * width:
+                    return None
+        except (OSError, EOFError, struct.error) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning(f"User store snapshot unreadable: {e}")
+            return None
+        finally:
+            # Ek hi baar kaam aata hai - is run mein crash hua to agla start rebuild karega
+            for leftover in (snap_path, self.path + ".log"):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+
+        self.user_ids, self.referral_counts, self.balances = user_ids, referral_counts, balances
+        self.flags, self.codes = flags, codes
+        self._resize(self._capacity)
+        for user_id in stale:
+            self._clock += 1
+            self._stale[user_id] = self._clock
+        return sequence
+
+    def save(self, conn=None):
+        """Write the snapshot (no-op without a path) - only when nothing writes any more
+
+        conn (the DB thread's) re-reads the current write sequence; without it the one
+        seen at load() is kept, which is only right if nothing was written since.
+        """
+        if self.path is None or self.owns is not None:
+            return
+        if conn is not None:
+            self.write_sequence = self._totals(conn).get('user_writes')
+        if self.write_sequence is None:
+            # Migration 7 se pehle ka database - snapshot verify nahi ho sakta
+            return
+        temp_path = self.path + ".snap.tmp"
+        stale = array('q', self._stale)
+        with open(temp_path, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.write_sequence, self.code_width, len(self.user_ids)))
+            self.user_ids.tofile(f)
+            self.referral_counts.tofile(f)
+            self.balances.tofile(f)
+            f.write(self.flags)
+            f.write(self.codes)
+            f.write(struct.pack("<Q", len(stale)))
+            stale.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path + ".snap")
+
+    def close(self, conn=None):
+        """Snapshot on clean shutdown so the next start skips the users table scan"""
+        self.save(conn)
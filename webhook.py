@@ -0,0 +1,103 @@
+"""
+Webhook serving mode
+Telegram updates seedha HTTP POST se aate hain aur Application ki update_queue mein jaate hain -
+wahi handlers, bina long-polling ke
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+from http_server import HTTPServer, text_response
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class WebhookReceiver:
+    """Accepts Telegram update JSON on `path` and feeds it to the application"""
+
+    def __init__(self, application, listen: str, port: int, path: str,
+                 secret_token: str = "", max_connections: int = 40):
+        self.application = application
+        self.path = path if path.startswith('/') else f'/{path}'
+        self.secret_token = secret_token
+        self.server = HTTPServer(listen, port, max_connections=max_connections)
+        self.server.route('POST', self.path, self.handle_update)
+        self.server.route('GET', '/', self.health)
+        self.received = 0
+
+    async def health(self, request):
+        return text_response(200, "OK")
+
+    async def handle_update(self, request):
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ''), self.secret_token
+        ):
+            return text_response(403, "forbidden")
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logging.warning(f"Bad webhook payload: {e}")
+            return text_response(400, "bad update")
+        if update is None:
+            return text_response(400, "bad update")
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return text_response(200, "")
+
+    async def start(self):
+        await self.server.start()
+
+    async def stop(self):
+        await self.server.stop()
+
+
+async def serve_webhook(application, listen: str, port: int, path: str, webhook_url: str = "",
+                        secret_token: str = "", max_connections: int = 40, routes=None):
+    """Run the application behind a webhook until SIGINT/SIGTERM
+
+    Mirrors the run_polling lifecycle (initialize, post_init, start ... stop, post_stop,
+    shutdown, post_shutdown). If webhook_url is empty, setWebhook is not called - useful
+    for local testing by POSTing update JSON to http://listen:port/path.
+    routes = extra {(method, path): handler} served by the same server (shard internals).
+    """
+    receiver = WebhookReceiver(application, listen, port, path, secret_token, max_connections)
+    for (method, route_path), handler in (routes or {}).items():
+        receiver.server.route(method, route_path, handler)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.start()
+        await receiver.start()
+        print(f"✅ Webhook server listening on {listen}:{receiver.server.port}{receiver.path}")
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url.rstrip('/') + receiver.path,
+                secret_token=secret_token or None,
+                max_connections=max_connections,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            print(f"✅ Webhook set: {webhook_url.rstrip('/')}{receiver.path}")
+        await stop_event.wait()
+    finally:
+        await receiver.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)